@@ -0,0 +1,184 @@
+"""
+    Async serving mode: the explorer's Flask routes over ASGI.
+
+    Node data a page needs (block, transactions, receipt, account...) is prefetched concurrently on the event loop
+    with a non-blocking client (asyncnode.py), so slow node calls don't each hold a worker thread. The page is then
+    rendered by the same Flask views, in a small thread pool, from what was prefetched (anything else is still
+    loaded by the sync puller). The WSGI deployment (`getApp()`, `python explorer.py`) is unchanged.
+
+    uvicorn asgi:app --workers 2
+"""
+import asyncio, contextvars, io, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+from werkzeug.exceptions import HTTPException
+import asyncnode, explorer, tracing
+
+RENDER_WORKERS = 8 # threads rendering pages (CPU bound once data is prefetched)
+
+renderPool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+client = asyncnode.AsyncNodeClient(explorer.NODE_URL, explorer.NODE_POOL_SIZE, explorer.NODE_TIMEOUT, explorer.NODE_RETRIES, explorer.NODE_RETRY_BACKOFF)
+puller = explorer.explorer.puller
+
+async def inPool(function, *args):
+    # blocking work (index reads, which can wait on a commit, and decoding: signature recovery of web3 transactions)
+    # is kept off the event loop, where it would stall every request in flight
+    return await asyncio.get_running_loop().run_in_executor(renderPool, contextvars.copy_context().run, function, *args)
+
+def unknownTransactions(txids):
+    _missing = [h for h in txids if not puller.cache.get(("tx", h.lower()))]
+    if puller.index:
+        _indexed = puller.index.transactions(_missing)
+        _missing = [h for h in _missing if not h in _indexed]
+    return _missing
+
+def cacheTransactions(raws):
+    return [puller.cacheTransaction(r) for r in raws]
+
+# prefetchers, by Flask endpoint: fill the puller's cache (or PREFETCHED) with what the view will load
+async def prefetchTransactions(txids):
+    _missing = await inPool(unknownTransactions, txids)
+    _raws = [r for _chunkRaws in await asyncio.gather(*[client.get(f"/get/transactions/{','.join(c)}", []) for c in puller.txidChunks(_missing)]) for r in _chunkRaws]
+    await inPool(cacheTransactions, _raws)
+
+async def prefetchBlock(bkid, limit, cursor):
+    _byHeight = bkid.isnumeric()
+    _block = puller.cache.get(("block", int(bkid)) if _byHeight else ("block", bkid.lower()))
+    if not _block:
+        _indexed = puller.index and await inPool(puller.index.block, bkid)
+        _block = await inPool(puller.cacheBlock, _indexed or await client.get(f"/chain/block/{bkid}" if _byHeight else f"/chain/blockByHash/{bkid}", {}))
+    await prefetchTransactions((await inPool(explorer.explorer.blockTxsPage, _block, limit, cursor))[0])
+
+async def prefetchTransaction(txid):
+    async def _tx():
+        if await inPool(unknownTransactions, [txid]):
+            await inPool(cacheTransactions, await client.get(f"/get/transactions/{txid}", []))
+    async def _receipt():
+        if not puller.cache.get(("receipt", txid.lower())):
+            puller.cacheReceipt(txid, await client.receipt(txid))
+    await asyncio.gather(_tx(), _receipt())
+
+async def prefetchAccount(addr, limit, cursor):
+    (_tokens, _calls) = puller.tokenHoldingsCalls(explorer.w3.toChecksumAddress(addr))
+    (_raw, _results) = await asyncio.gather(client.get(f"/accounts/accountInfo/{addr}"), client.rpc(_calls))
+    _account = await inPool(lambda: puller.Account(_raw, puller.decodeHoldings(_tokens, _calls, _results)))
+    explorer.PREFETCHED.get()[("account", addr.lower())] = _account
+    await prefetchTransactions((await inPool(explorer.explorer.accountTxsPage, addr, _account.transactions[1:], limit, cursor))[0])
+
+async def prefetchHomepage():
+    async def _lastTxs():
+        explorer.PREFETCHED.get()[("lastTxs", 10)] = await client.get("/get/nLastTxs/10")
+    async def _block(height):
+        if not puller.cache.get(("block", height)):
+            await inPool(puller.cacheBlock, await client.get(f"/chain/block/{height}", {}))
+    (_stats, _) = explorer.explorer.networkStats.current # heights of the last blocks, if stats were loaded already
+    await asyncio.gather(_lastTxs(), *[_block(h) for h in (_stats.blocks if _stats else [])])
+
+def pageArgs(query):
+    try:
+        _limit = min(max(int(query.get("limit", [explorer.TXS_PAGE_SIZE])[0]), 1), explorer.TXS_PAGE_MAX)
+    except ValueError:
+        _limit = explorer.TXS_PAGE_SIZE
+    return (_limit, query.get("cursor", [None])[0])
+
+PREFETCHERS = {
+    "block": lambda args, query: prefetchBlock(args["bkid"], *pageArgs(query)),
+    "tx": lambda args, query: prefetchTransaction(args["txid"]),
+    "address": lambda args, query: prefetchAccount(args["addr"], *pageArgs(query)),
+    "homepage": lambda args, query: prefetchHomepage(),
+}
+
+def wsgiEnviron(scope, body):
+    _server = scope.get("server") or ("localhost", 80)
+    _environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": _server[0],
+        "SERVER_PORT": str(_server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for (_name, _value) in scope.get("headers", []):
+        _name = _name.decode("latin1").upper().replace("-", "_")
+        _key = _name if _name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{_name}"
+        _value = _value.decode("latin1")
+        _environ[_key] = f"{_environ[_key]},{_value}" if (_key in _environ) else _value
+    _environ["CONTENT_LENGTH"] = str(len(body)) # read whole already (also when it was sent chunked)
+    return _environ
+
+async def readBody(receive):
+    _body = b""
+    while True:
+        _message = await receive()
+        _body += _message.get("body", b"")
+        if not _message.get("more_body"):
+            return _body
+
+async def lifespan(receive, send):
+    while True:
+        _message = await receive()
+        if _message["type"] == "lifespan.startup":
+            await client.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif _message["type"] == "lifespan.shutdown":
+            await client.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    _start = time.perf_counter()
+    if not client.session: # server without lifespan support
+        await client.start()
+    _environ = wsgiEnviron(scope, await readBody(receive))
+    _environ["explorer.requestStart"] = _start # request duration includes the prefetch
+    _loop = asyncio.get_running_loop()
+
+    # each request runs in its own task, so these only concern this request (reset, a task inherits its creator's)
+    explorer.PREFETCHED.set({})
+    tracing.CURRENT.set(None)
+    try:
+        (_endpoint, _args) = explorer.app.url_map.bind_to_environ(_environ).match()
+    except HTTPException:
+        (_endpoint, _args) = (None, {})
+    _rule = next((r.rule for r in explorer.app.url_map.iter_rules(_endpoint)), "<unmatched>") if _endpoint else "<unmatched>"
+    tracing.start(scope["method"], scope["path"], _rule)
+    if _endpoint in PREFETCHERS:
+        try:
+            await PREFETCHERS[_endpoint](_args, parse_qs(_environ["QUERY_STRING"]))
+        except explorer.RaptorChainExplorer.CursorNotFound:
+            pass # answered by the view
+        except Exception as e:
+            print(f"Prefetch failed: {e.__repr__()}") # the view loads what's missing
+
+    # rendered by the Flask app (same hooks and views), every step in this request's context
+    _context = contextvars.copy_context()
+    _started = []
+    def _startResponse(status, headers, excInfo=None):
+        _started.append((int(status.split(" ")[0]), [(k.lower().encode("latin1"), v.encode("latin1")) for (k, v) in headers]))
+    _body = await _loop.run_in_executor(renderPool, _context.run, explorer.app.wsgi_app, _environ, _startResponse)
+    try:
+        _chunks = iter(_body)
+        # streamed pages: each piece is rendered in the pool and sent as soon as it's ready
+        _chunk = await _loop.run_in_executor(renderPool, _context.run, next, _chunks, None)
+        (_status, _headers) = _started[0]
+        await send({"type": "http.response.start", "status": _status, "headers": _headers})
+        while _chunk is not None:
+            await send({"type": "http.response.body", "body": _chunk, "more_body": True})
+            _chunk = await _loop.run_in_executor(renderPool, _context.run, next, _chunks, None)
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    finally:
+        if hasattr(_body, "close"):
+            await _loop.run_in_executor(renderPool, _context.run, _body.close)
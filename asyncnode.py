@@ -0,0 +1,68 @@
+import asyncio, aiohttp, metrics
+from web3 import Web3
+from web3.datastructures import AttributeDict
+from web3.eth import AsyncEth
+from web3.providers.async_rpc import AsyncHTTPProvider
+
+# non-blocking counterpart of RaptorChainPuller's node transport, used by the ASGI mode (asgi.py)
+# aiohttp comes with web3, no extra dependency
+
+class AsyncNodeClient(object):
+    """
+        Node REST and JSON-RPC calls on a single aiohttp session (keep-alive pool), timed like the sync ones.
+        Has to be started (and closed) from the event loop serving requests.
+    """
+    def __init__(self, node, poolSize, timeout, retries, retryBackoff):
+        self.node = node
+        self.poolSize = poolSize
+        self.timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        self.retries = retries
+        self.retryBackoff = retryBackoff
+        self.session = None
+        self.web3 = None
+
+    async def start(self):
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.poolSize), timeout=self.timeout)
+        # receipts go through web3, so they're formatted exactly like the sync puller's
+        self.web3 = Web3(AsyncHTTPProvider(f"{self.node}/web3", request_kwargs={"timeout": self.timeout}), modules={"eth": (AsyncEth,)}, middlewares=[])
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+
+    async def request(self, method, url, **kwargs):
+        # retried on connection errors and 5xx responses, with exponential backoff (like the sync session)
+        for _attempt in range(self.retries + 1):
+            try:
+                async with self.session.request(method, url, **kwargs) as _resp:
+                    if (_resp.status < 500) or (_attempt == self.retries):
+                        return await _resp.json(content_type=None)
+            except aiohttp.ClientConnectionError:
+                if _attempt == self.retries:
+                    raise
+            await asyncio.sleep(self.retryBackoff * (2 ** _attempt))
+
+    async def get(self, path, default=None):
+        # same as RaptorChainPuller.nodeGet
+        with metrics.timeUpstream("node", "/" + "/".join(path.strip("/").split("/")[:2])):
+            return (await self.request("GET", f"{self.node}{path}")).get("result", default)
+
+    async def rpc(self, calls):
+        # same as JSONRPCBatch.call: [(method, params)] in a single batch, results in the same order (None for failed calls)
+        if not len(calls):
+            return []
+        _labels = [metrics.rpcLabel(method, params) for (method, params) in calls]
+        for _label in _labels:
+            metrics.RPC_METHODS.inc(_label)
+        _payload = [{"jsonrpc": "2.0", "id": n, "method": method, "params": params} for n, (method, params) in enumerate(calls)]
+        with metrics.timeUpstream("node-rpc", metrics.batchLabel(_labels)):
+            _responses = await self.request("POST", f"{self.node}/web3", json=_payload)
+        if not isinstance(_responses, list): # batches not supported, one request per call
+            _responses = await asyncio.gather(*[self.request("POST", f"{self.node}/web3", json=p) for p in _payload])
+        _byId = {r.get("id"): r for r in _responses if isinstance(r, dict)}
+        return [_byId.get(n, {}).get("result") for n in range(len(calls))]
+
+    async def receipt(self, txid):
+        metrics.RPC_METHODS.inc("eth_getTransactionReceipt")
+        with metrics.timeUpstream("node-web3", "eth_getTransactionReceipt"):
+            return AttributeDict.recursive(await self.web3.eth.get_transaction_receipt(txid))
@@ -1,10 +1,15 @@
-import requests, rlp, flask, json, time, eth_abi, pathfinder
+import requests, rlp, flask, json, math, os, time, threading, contextvars, eth_abi, pathfinder, metastore, metrics, tracing, indexer
 from rlp.sedes import Binary, big_endian_int, binary
 from flask_cors import CORS
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from dataclasses import asdict, dataclass
 from typing import Optional
 from eth_utils import keccak
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from web3 import Web3, HTTPProvider
+from web3.exceptions import TransactionNotFound
 from web3.auto import w3
 
 ROUTERADDRESS = "0x397D194abF71094247057642003EaCd463b7931f" # address of RaptorSwap router
@@ -13,11 +18,57 @@ WRPTRADDRESS = "0xeF7cADE66695f4cD8a535f7916fBF659936818C4" # address of WRPTR
 
 CALLROUTERS = ["0x47C0D110eEB1357225B707E0515B17Ab0EB1CaF6", "0xf9bEe606Ae868e05245cFDEd7AA10598ce682495"] # routing addresses meant to route user-initiated calls (executed in a lower permission context)
 
+# upstreams, overridable from the environment (e.g. to point at stubnode.py)
+NODE_URL = os.environ.get("EXPLORER_NODE", "http://127.0.0.1:4242/")
+
 CACHED_SUPPLY = 0
 LAST_SUPPLY_REFRESH = 0
 SUPPLY_REFRESH_DELAY = 3600 # refresh at most once per hour
 
-BSC_RPC = "https://bscrpc.com/"
+# node transport settings (shared keep-alive pool for REST and web3 calls)
+NODE_POOL_SIZE = 32 # max idle keep-alive connections kept open to the node
+NODE_TIMEOUT = (3.05, 20) # (connect, read) timeout of a single node call, in seconds
+NODE_RETRIES = 3 # retries on connection errors and 5xx responses
+NODE_RETRY_BACKOFF = 0.2 # exponential backoff factor between retries (0.2s, 0.4s, 0.8s...)
+NODE_MAX_URL = 2000 # longest URL the node (and nginx in front of it) accepts, bounds txids per `/get/transactions/` call
+TX_CHUNK_SIZE = 50 # max txids per `/get/transactions/` call, bounds response size (shrinks by itself if the node finds a chunk too large)
+TX_CHUNK_GROW_AFTER = 20 # full chunks fetched in a row before a shrunk chunk size is doubled back (up to TX_CHUNK_SIZE)
+TX_BATCH_WORKERS = 8 # max concurrent `/get/transactions/` calls for a single batch
+RPC_BATCH_REPROBE_DELAY = 600 # seconds JSON-RPC batches stay off after the endpoint rejected one, before trying again
+PAGE_FETCH_WORKERS = 16 # max concurrent independent fetches of page renders (transaction and its receipt, homepage blocks...)
+
+# cache for blocks, transactions and receipts (they don't change once final)
+CACHE_MAX_ENTRIES = 50000
+CACHE_MAX_BYTES = 64 * 1024 * 1024 # estimated from JSON size
+REORG_DEPTH = 10 # last blocks that may still be reorganized
+RECENT_TTL = 15 # seconds objects from the last `REORG_DEPTH` blocks stay cached
+
+TOKEN_SUPPLY_TTL = 300 # token total supplies are refreshed lazily, at most every 5 minutes
+
+# transaction lists (account history, block transactions) are paged, only the shown transactions are loaded
+TXS_PAGE_SIZE = 25 # default `limit`
+TXS_PAGE_MAX = 200 # highest `limit` accepted
+INDEX_TAIL_CHUNK = 100 # newest account txids checked at once against the index, looking for those it doesn't have yet
+
+# account and block pages are streamed: page shell and navbar are sent first, table rows as transactions get loaded
+STREAM_PAGES = (os.environ.get("EXPLORER_STREAM", "1") == "1")
+STREAM_CHUNK = 25 # transactions loaded (and rows sent) at once in streamed tables
+
+# DeFi data (reserves, price, TVL) is refreshed by a background thread, pages only read its last snapshot
+DEFI_REFRESH_DELAY = 300 # seconds between two refreshes
+DEFI_RETRY_DELAY = 30 # seconds between two refreshes while price is invalid (price API unreachable)
+SYNC_POLL_DELAY = 5 # seconds between two polls of Sync logs (reserves of pools that traded), in between full refreshes
+SYNC_MAX_RANGE = 5000 # max blocks per eth_getLogs, a bigger gap falls back to a full refresh
+PRICE_API = os.environ.get("EXPLORER_PRICE_API", "https://api.mobula.io/api/1/market/data?asset=Raptor%20Finance")
+
+NETWORK_STATS_TTL = 10 # seconds the navbar network stats are served without revalidation
+
+SWAPQUOTE_MAX_AMOUNTS = 10 # amounts quoted by a single `/swapquote` request (each one is quoted on every candidate route)
+
+# data loaded ahead of the render by the ASGI mode (asgi.py), by key, read by loaders that don't go through the cache
+PREFETCHED = contextvars.ContextVar("prefetched", default={})
+
+BSC_RPC = os.environ.get("EXPLORER_BSC_RPC", "https://bscrpc.com/")
 RPTR_BSC_ADDRESS = "0x44C99Ca267C2b2646cEEc72e898273085aB87ca5"
 
 # known methods for calldata parsing (needed to compute selector)
@@ -48,8 +99,19 @@ FACTORYABI = """[{"inputs":[{"internalType":"address","name":"_feeToSetter","typ
 PAIRABI = """[{"inputs":[],"payable":false,"stateMutability":"nonpayable","type":"constructor"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"owner","type":"address"},{"indexed":true,"internalType":"address","name":"spender","type":"address"},{"indexed":false,"internalType":"uint256","name":"value","type":"uint256"}],"name":"Approval","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"sender","type":"address"},{"indexed":false,"internalType":"uint256","name":"amount0","type":"uint256"},{"indexed":false,"internalType":"uint256","name":"amount1","type":"uint256"},{"indexed":true,"internalType":"address","name":"to","type":"address"}],"name":"Burn","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"sender","type":"address"},{"indexed":false,"internalType":"uint256","name":"amount0","type":"uint256"},{"indexed":false,"internalType":"uint256","name":"amount1","type":"uint256"}],"name":"Mint","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"sender","type":"address"},{"indexed":false,"internalType":"uint256","name":"amount0In","type":"uint256"},{"indexed":false,"internalType":"uint256","name":"amount1In","type":"uint256"},{"indexed":false,"internalType":"uint256","name":"amount0Out","type":"uint256"},{"indexed":false,"internalType":"uint256","name":"amount1Out","type":"uint256"},{"indexed":true,"internalType":"address","name":"to","type":"address"}],"name":"Swap","type":"event"},{"anonymous":false,"inputs":[{"indexed":false,"internalType":"uint112","name":"reserve0","type":"uint112"},{"indexed":false,"internalType":"uint112","name":"reserve1","type":"uint112"}],"name":"Sync","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"from","type":"address"},{"indexed":true,"internalType":"address","name":"to","type":"address"},{"indexed":false,"internalType":"uint256","name":"value","type":"uint256"}],"name":"Transfer","type":"event"},{"constant":true,"inputs":[],"name":"DOMAIN_SEPARATOR","outputs":[{"internalType":"bytes32","name":"","type":"bytes32"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"MINIMUM_LIQUIDITY","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"PERMIT_TYPEHASH","outputs":[{"internalType":"bytes32","name":"","type":"bytes32"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[{"internalType":"address","name":"","type":"address"},{"internalType":"address","name":"","type":"address"}],"name":"allowance","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"spender","type":"address"},{"internalType":"uint256","name":"value","type":"uint256"}],"name":"approve","outputs":[{"internalType":"bool","name":"","type":"bool"}],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[{"internalType":"address","name":"","type":"address"}],"name":"balanceOf","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"to","type":"address"}],"name":"burn","outputs":[{"internalType":"uint256","name":"amount0","type":"uint256"},{"internalType":"uint256","name":"amount1","type":"uint256"}],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"decimals","outputs":[{"internalType":"uint8","name":"","type":"uint8"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"factory","outputs":[{"internalType":"address","name":"","type":"address"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"getReserves","outputs":[{"internalType":"uint112","name":"_reserve0","type":"uint112"},{"internalType":"uint112","name":"_reserve1","type":"uint112"},{"internalType":"uint32","name":"_blockTimestampLast","type":"uint32"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"_token0","type":"address"},{"internalType":"address","name":"_token1","type":"address"}],"name":"initialize","outputs":[],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"kLast","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"to","type":"address"}],"name":"mint","outputs":[{"internalType":"uint256","name":"liquidity","type":"uint256"}],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"name","outputs":[{"internalType":"string","name":"","type":"string"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[{"internalType":"address","name":"","type":"address"}],"name":"nonces","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"owner","type":"address"},{"internalType":"address","name":"spender","type":"address"},{"internalType":"uint256","name":"value","type":"uint256"},{"internalType":"uint256","name":"deadline","type":"uint256"},{"internalType":"uint8","name":"v","type":"uint8"},{"internalType":"bytes32","name":"r","type":"bytes32"},{"internalType":"bytes32","name":"s","type":"bytes32"}],"name":"permit","outputs":[],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"price0CumulativeLast","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"price1CumulativeLast","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"to","type":"address"}],"name":"skim","outputs":[],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":false,"inputs":[{"internalType":"uint256","name":"amount0Out","type":"uint256"},{"internalType":"uint256","name":"amount1Out","type":"uint256"},{"internalType":"address","name":"to","type":"address"},{"internalType":"bytes","name":"data","type":"bytes"}],"name":"swap","outputs":[],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"symbol","outputs":[{"internalType":"string","name":"","type":"string"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[],"name":"sync","outputs":[],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"token0","outputs":[{"internalType":"address","name":"","type":"address"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"token1","outputs":[{"internalType":"address","name":"","type":"address"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"totalSupply","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"value","type":"uint256"}],"name":"transfer","outputs":[{"internalType":"bool","name":"","type":"bool"}],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"from","type":"address"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"value","type":"uint256"}],"name":"transferFrom","outputs":[{"internalType":"bool","name":"","type":"bool"}],"payable":false,"stateMutability":"nonpayable","type":"function"}]"""
 
 BSC = Web3(HTTPProvider(BSC_RPC))
+BSC.middleware_onion.add(metrics.web3Middleware("bsc"))
 RPTR_CONTRACT_BSC = BSC.eth.contract(address=RPTR_BSC_ADDRESS, abi=ERC20ABI)
 
+# precomputed ABI encoding for batched balance scans: balanceOf(address) selector, holder gets appended as a 32 bytes word
+BALANCEOF_SELECTOR = "0x" + keccak(text="balanceOf(address)")[:4].hex()
+GETRESERVES_SELECTOR = "0x" + keccak(text="getReserves()")[:4].hex()
+ALLPAIRS_SELECTOR = "0x" + keccak(text="allPairs(uint256)")[:4].hex()
+SYNC_TOPIC = "0x" + keccak(text="Sync(uint112,uint112)").hex()
+
+# contract methods the explorer calls, eth_calls are timed and counted by method in metrics
+for _signature in ("balanceOf(address)", "getReserves()", "allPairs(uint256)", "allPairsLength()", "totalSupply()", "name()", "symbol()", "decimals()", "token0()", "token1()"):
+    metrics.SELECTOR_NAMES["0x" + keccak(text=_signature)[:4].hex()] = _signature.split("(")[0]
+
 # token icons
 TOKENICONURLS = {
     WRPTRADDRESS: "https://raptorchain.io/images/logo.png",
@@ -153,6 +215,218 @@ class TransferParser(object):
 methodParser = MethodParser(KNOWNMETHODS)
 transferParser = TransferParser()
 
+class JSONRPCBatch(object):
+    # sends several JSON-RPC calls in a single HTTP round trip
+    # falls back to one request per call if the endpoint rejects batches (tried again every RPC_BATCH_REPROBE_DELAY)
+    def __init__(self, session, url, timeout):
+        self.session = session
+        self.url = url
+        self.timeout = timeout
+        self.batchesOffUntil = 0 # set when the endpoint answered a batch with a JSON-RPC error
+        
+    def post(self, payload):
+        _label = metrics.batchLabel([metrics.rpcLabel(p["method"], p["params"]) for p in payload]) if isinstance(payload, list) else metrics.rpcLabel(payload["method"], payload["params"])
+        with metrics.timeUpstream("node-rpc", _label):
+            return self.session.post(self.url, json=payload, timeout=self.timeout).json()
+    
+    def call(self, calls):
+        # calls: [(method, params)], returns results in the same order (None for failed calls)
+        if not len(calls):
+            return []
+        for (method, params) in calls:
+            metrics.RPC_METHODS.inc(metrics.rpcLabel(method, params))
+        _payload = [{"jsonrpc": "2.0", "id": n, "method": method, "params": params} for n, (method, params) in enumerate(calls)]
+        _responses = None
+        if time.time() >= self.batchesOffUntil:
+            # not valid JSON (e.g. a 502 page) is raised as is: a transient failure, not an answer about batches
+            _responses = self.post(_payload)
+            if not isinstance(_responses, list):
+                if isinstance(_responses, dict) and ("error" in _responses): # e.g. -32600 invalid request
+                    self.batchesOffUntil = time.time() + RPC_BATCH_REPROBE_DELAY
+                _responses = None
+        if _responses is None:
+            _responses = [self.post(p) for p in _payload]
+        _byId = {r.get("id"): r for r in _responses if isinstance(r, dict)}
+        return [_byId.get(n, {}).get("result") for n in range(len(calls))]
+        
+    def decodeUint(self, result):
+        return int(result, 16) if (result and (result != "0x")) else 0
+
+class ReserveStore(object):
+    # getReserves() of every pair, fetched in a single batch per refresh cycle
+    # shared by the DeFi dashboard and the pathfinder, so both always see the same reserves
+    def __init__(self, rpc):
+        self.rpc = rpc
+        self.reserves = {} # pair address -> (reserve0, reserve1), replaced at once
+        self.timestamp = 0
+        self.lastBlock = 0 # Sync logs up to this block are accounted for
+    
+    def fetch(self, pairs, full=True):
+        # full: `pairs` are all pairs, reserves are then known as of the returned block number
+        _results = self.rpc.call([("eth_blockNumber", [])] + [("eth_call", [{"to": _pair, "data": GETRESERVES_SELECTOR}, "latest"]) for _pair in pairs])
+        _reserves = dict(self.reserves)
+        for (_pair, _result) in zip(pairs, _results[1:]):
+            if _result and (len(_result) > 2):
+                (_reserve0, _reserve1, _) = eth_abi.decode_abi(["uint112", "uint112", "uint32"], bytes.fromhex(_result[2:]))
+                _reserves[_pair] = (_reserve0, _reserve1)
+            # failed calls keep the former reserves
+        self.reserves = _reserves
+        self.timestamp = time.time()
+        if full:
+            self.lastBlock = self.rpc.decodeUint(_results[0])
+        return _reserves
+    
+    def follow(self, pairs):
+        # applies Sync logs emitted since lastBlock, returns {pair: (reserve0, reserve1)} of pools that changed
+        # None if logs can't be used (no starting block, gap too big, failed call), a full fetch is needed then
+        _head = self.rpc.decodeUint(self.rpc.call([("eth_blockNumber", [])])[0])
+        if (not self.lastBlock) or ((_head - self.lastBlock) > SYNC_MAX_RANGE):
+            return None
+        if _head <= self.lastBlock:
+            return {}
+        (_logs,) = self.rpc.call([("eth_getLogs", [{"fromBlock": hex(self.lastBlock + 1), "toBlock": hex(_head), "address": pairs, "topics": [SYNC_TOPIC]}])])
+        if _logs is None:
+            return None
+        _changed = {}
+        for _log in sorted(_logs, key=lambda _l: (int(_l["blockNumber"], 16), int(_l["logIndex"], 16))):
+            if not _log.get("removed"):
+                _changed[w3.toChecksumAddress(_log["address"])] = tuple(eth_abi.decode_abi(["uint112", "uint112"], bytes.fromhex(_log["data"][2:])))
+        # reorganized blocks are caught up by the next full fetch
+        self.reserves = {**self.reserves, **_changed}
+        self.timestamp = time.time()
+        self.lastBlock = _head
+        return _changed
+    
+    def get(self, pair):
+        return self.reserves.get(pair, (0, 0))
+
+class StaleWhileRevalidate(object):
+    # keeps the last result of `loader`, once older than `ttl` it's still served while a single background call refreshes it
+    # only the very first call waits (concurrent ones wait on the same fetch)
+    def __init__(self, loader, ttl):
+        self.loader = loader
+        self.ttl = ttl
+        self.current = (None, 0) # (value, timestamp), replaced at once
+        self.lock = threading.Lock()
+        self.refreshing = False
+    
+    def get(self):
+        (_value, _timestamp) = self.current
+        if not _timestamp:
+            with self.lock:
+                if not self.current[1]:
+                    self.current = (self.loader(), time.time())
+            return self.current[0]
+        if (time.time() - _timestamp) >= self.ttl:
+            with self.lock:
+                _start = not self.refreshing
+                self.refreshing = True
+            if _start:
+                threading.Thread(target=self.revalidate, daemon=True).start()
+        return _value
+    
+    def revalidate(self):
+        try:
+            self.current = (self.loader(), time.time())
+        except Exception as e:
+            print(f"Revalidation failed: {e.__repr__()}") # keeps serving the former value
+        finally:
+            self.refreshing = False
+    
+    def age(self):
+        return time.time() - self.current[1]
+
+class SingleFlight(object):
+    # concurrent calls for the same key wait on the fetch already in flight and share its result (or exception)
+    # nothing is kept once it's done, caching is up to the caller
+    class Flight(object):
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+    
+    def __init__(self):
+        self.flights = {} # key -> Flight
+        self.lock = threading.Lock()
+    
+    def do(self, key, loader, *args):
+        with self.lock:
+            _flight = self.flights.get(key)
+            _leader = (_flight is None)
+            if _leader:
+                _flight = self.flights[key] = self.Flight()
+        if not _leader:
+            metrics.SINGLEFLIGHT_SHARED.inc(key[0])
+            _flight.done.wait()
+            if _flight.error:
+                raise _flight.error
+            return _flight.result
+        try:
+            _flight.result = loader(*args)
+            return _flight.result
+        except Exception as e:
+            _flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            _flight.done.set()
+
+class ObjectCache(object):
+    # LRU cache, bounded by entry count and estimated size in bytes
+    # an entry can be reached through several keys (e.g. block height and hash), only the first one counts as an entry
+    def __init__(self, maxEntries=CACHE_MAX_ENTRIES, maxBytes=CACHE_MAX_BYTES):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict() # key -> (value, size, expiry, aliases)
+        self.aliases = {} # alias -> key
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+    
+    def estimateSize(self, obj):
+        return len(json.dumps(obj, default=str))
+    
+    def get(self, key):
+        with self.lock:
+            key = self.aliases.get(key, key)
+            _entry = self.entries.get(key)
+            if _entry and ((_entry[2] is None) or (_entry[2] > time.time())):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return _entry[0]
+            if _entry: # expired
+                self.drop(key)
+            self.misses += 1
+            return None
+    
+    def put(self, keys, value, size, ttl=None):
+        with self.lock:
+            (key, aliases) = (keys[0], keys[1:])
+            if key in self.entries:
+                self.drop(key)
+            self.entries[key] = (value, size, ((time.time() + ttl) if ttl else None), aliases)
+            self.size += size
+            for _alias in aliases:
+                self.aliases[_alias] = key
+            while len(self.entries) and ((len(self.entries) > self.maxEntries) or (self.size > self.maxBytes)):
+                self.drop(next(iter(self.entries))) # least recently used
+                self.evictions += 1
+    
+    def drop(self, key):
+        # lock has to be held by caller
+        (_, _size, _, _aliases) = self.entries.pop(key)
+        self.size -= _size
+        for _alias in _aliases:
+            if self.aliases.get(_alias) == key:
+                del self.aliases[_alias]
+    
+    def stats(self):
+        _lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hitRatio": ((self.hits / _lookups) if _lookups else 0), "entries": len(self.entries), "bytes": self.size, "evictions": self.evictions}
+
 class RaptorChainPuller(object):
     class Transaction(object):
         class ETHTransactionDecoder(object):
@@ -200,6 +474,7 @@ class RaptorChainPuller(object):
     
     
         def __init__(self, tx):
+            self.raw = tx # as served by the node, kept for the local index
             txData = json.loads(tx["data"])
             self.contractDeployment = False
             self.txtype = (txData.get("type") or 0)
@@ -309,6 +584,21 @@ class RaptorChainPuller(object):
             if not _addr in self.affectedAccounts:
                 self.affectedAccounts.append(_addr)
                 
+    class Deposit(object):
+        # cross-chain deposit, not served by `/get/transactions/` so it's built from its web3 representation
+        def __init__(self, ethTx):
+            self.txid = w3.toHex(ethTx["hash"])
+            self.txtype = None
+            self.typeName = "cross-chain deposit"
+            self.sender = ethTx.get("from") or "0x0000000000000000000000000000000000000000"
+            self.recipient = ethTx.get("to") or "0x0000000000000000000000000000000000000000"
+            self.value = int(ethTx.get("value", 0))
+            self.affectedAccounts = [self.sender, self.recipient]
+            self.data = b""
+            self.fee = 0
+            self.gasprice = 0
+            self.gasLimit = 0
+            
     class Account(object):
         def __init__(self, infoDict, _tokens={}):
             self.balance = infoDict.get("balance", 0)
@@ -333,6 +623,17 @@ class RaptorChainPuller(object):
         def isPositive(self, number):
             return number >= 0
     
+    @dataclass(frozen=True)
+    class NetworkStats:
+        supply: int
+        burned: int
+        holders: int
+        chainLength: int
+        blocks: list
+        price: float
+        tvl: float
+        defiTimestamp: float
+    
     class Block(object):
         class Message(object):
             def __init__(self, msg):
@@ -343,6 +644,7 @@ class RaptorChainPuller(object):
                     (self._from, self.to, self.gasLimit, self.payload) = eth_abi.decode_abi(["address", "address", "uint256", "bytes"], self.payload)
                     
         def __init__(self, infoDict):
+            self.raw = infoDict # as served by the node, kept for the local index
             miningData = infoDict.get("miningData", {})
             self.miner = miningData.get("miner", "0x0000000000000000000000000000000000000000")
             self.proof = miningData.get("proof", "0x0000000000000000000000000000000000000000000000000000000000000000")
@@ -355,33 +657,47 @@ class RaptorChainPuller(object):
             self.transactions = list(filter(bool, infoDict.get("transactions", {})))
     
     class Token(object):
-        def __init__(self, contractInstance):
+        def __init__(self, contractInstance, metadata):
             self.contract = contractInstance
-            self.name = contractInstance.functions.name().call()
-            self.symbol = contractInstance.functions.symbol().call()
-            self.symbol = contractInstance.functions.symbol().call()
-            self.decimals = contractInstance.functions.decimals().call()
-            self.rawSupply = contractInstance.functions.totalSupply().call()
-            self.totalSupply = self.rawSupply / (10**self.decimals)
+            _meta = metadata.token(contractInstance) # immutable, comes from the on-disk store when known
+            self.name = _meta["name"]
+            self.symbol = _meta["symbol"]
+            self.decimals = _meta["decimals"]
+            self._rawSupply = 0
+            self.lastSupplyRefresh = 0
+        
+        @property
+        def rawSupply(self):
+            # only fetched when displayed
+            if (time.time() - self.lastSupplyRefresh) >= TOKEN_SUPPLY_TTL:
+                self._rawSupply = self.contract.functions.totalSupply().call()
+                self.lastSupplyRefresh = time.time()
+            return self._rawSupply
+        
+        @property
+        def totalSupply(self):
+            return self.rawSupply / (10**self.decimals)
     
     class DefiStats(object):
         class RaptorSwap(object):
             class Pair(object):
-                def __init__(self, _web3, _address):
+                def __init__(self, _web3, _address, _metadata):
                     self.web3 = _web3
                     self.contract = self.web3.eth.contract(address=w3.toChecksumAddress(_address), abi=PAIRABI)
                     
-                    self.token0 = self.contract.functions.token0().call()
-                    self.token1 = self.contract.functions.token1().call()
+                    _pairMeta = _metadata.pair(self.contract)
+                    self.token0 = _pairMeta["token0"]
+                    self.token1 = _pairMeta["token1"]
                     
                     self.token0contract = self.web3.eth.contract(address=w3.toChecksumAddress(self.token0), abi=ERC20ABI)
                     self.token1contract = self.web3.eth.contract(address=w3.toChecksumAddress(self.token1), abi=ERC20ABI)
                     
-                    self.ticker0 = self.token0contract.functions.symbol().call()
-                    self.ticker1 = self.token1contract.functions.symbol().call()
+                    (_meta0, _meta1) = (_metadata.token(self.token0contract), _metadata.token(self.token1contract))
+                    self.ticker0 = _meta0["symbol"]
+                    self.ticker1 = _meta1["symbol"]
                     
-                    self.decimals0 = self.token0contract.functions.decimals().call()
-                    self.decimals1 = self.token1contract.functions.decimals().call()
+                    self.decimals0 = _meta0["decimals"]
+                    self.decimals1 = _meta1["decimals"]
                     
                     self.ticker0 = "RPTR" if (self.token0 == WRPTRADDRESS) else self.ticker0
                     self.ticker1 = "RPTR" if (self.token1 == WRPTRADDRESS) else self.ticker1
@@ -396,121 +712,405 @@ class RaptorChainPuller(object):
                     # RPTR in pool
                     self.RPTRTVL = 0
                     
-                    self.refresh()
-                    
-                def refresh(self):
-                    (self.reserve0, self.reserve1, kLast) = self.contract.functions.getReserves().call()
+                def refresh(self, reserves):
+                    (self.reserve0, self.reserve1) = reserves
                     (self.reserve0formatted, self.reserve1formatted) = ((self.reserve0 / (10**self.decimals0)), (self.reserve1 / (10**self.decimals1)))
                     self.RPTRTVL = ((self.reserve0formatted if (self.token0 == WRPTRADDRESS) else 0) + (self.reserve1formatted if (self.token1 == WRPTRADDRESS) else 0))
             
-            def __init__(self, _web3):
+            def __init__(self, _web3, _rpc, _metadata):
                 self.web3 = _web3
+                self.rpc = _rpc
+                self.metadata = _metadata
+                self.reserves = ReserveStore(_rpc)
                 self.router = self.web3.eth.contract(address=ROUTERADDRESS, abi=ROUTERABI)
                 self.factory = self.web3.eth.contract(address=FACTORYADDRESS, abi=FACTORYABI)
                 self.pairs = []
                 self.pairsLenghtLast = 0
+                self.graphe = pathfinder.Graphe(self.web3) # this factory's own graph, pairs get added by fetchPairs
                 self.fetchPairs()
                 self.tvl = 0 # RPTR tvl
                 
             def fetchPairs(self):
+                # only pairs created since last call (index >= pairsLenghtLast), their arcs are added to the existing graph
                 _l = self.factory.functions.allPairsLength().call()
-                _pairAddrs = [self.factory.functions.allPairs(n).call() for n in range(_l)]
-                pathfinder.LOAD(self.web3, _pairAddrs)
-                self.pairs = [self.Pair(self.web3, addr) for addr in _pairAddrs] # fetches all pairs as objects
+                if _l <= self.pairsLenghtLast:
+                    return []
+                _results = self.rpc.call([("eth_call", [{"to": FACTORYADDRESS, "data": ALLPAIRS_SELECTOR + ("%064x" % n)}, "latest"]) for n in range(self.pairsLenghtLast, _l)])
+                if None in _results:
+                    return [] # tried again next cycle
+                _pairAddrs = [w3.toChecksumAddress("0x" + _result[-40:]) for _result in _results]
+                _reserves = self.reserves.fetch(_pairAddrs, False)
+                self.graphe.ajoute(_pairAddrs, self.metadata, _reserves)
+                _newPairs = [self.Pair(self.web3, addr, self.metadata) for addr in _pairAddrs] # fetches new pairs as objects
+                for _pair in _newPairs:
+                    _pair.refresh(self.reserves.get(_pair.contract.address))
+                self.pairs = self.pairs + _newPairs # replaced at once, pages may be iterating over the former list
                 self.pairsLenghtLast = _l
+                return _newPairs
     
             def path(self, tokenA, tokenB):
-                return [n.__repr__() for n in pathfinder.graph.cheminLeMoinsCher(tokenA, tokenB).noeuds]
+                _route = self.graphe.route(tokenA, tokenB) # precomputed, kept up to date on reserve changes
+                return [n.__repr__() for n in _route.noeuds] if _route else None
+            
+            def quote(self, tokenA, tokenB, amounts):
+                # slippage-aware: best routes for each input amount (raw token units), with expected output and price impact
+                return [[{"path": [n.__repr__() for n in route.noeuds], "amountOut": int(out), "priceImpact": (float(impact) if math.isfinite(impact) else None)} for (route, out, impact) in quotes] for quotes in self.graphe.meilleuresCotations(tokenA, tokenB, amounts)]
     
             def refresh(self):
+                self.fetchPairs() # new pools show up without a restart
+                # one batched getReserves for all pairs, dashboard and pathfinder both derive from it
+                _reserves = self.reserves.fetch([p.contract.address for p in self.pairs])
                 for _pair in self.pairs:
-                    _pair.refresh()
+                    _pair.refresh(self.reserves.get(_pair.contract.address))
                 self.tvl = sum([p.RPTRTVL for p in self.pairs])
-                pathfinder.refresh()
+                self.graphe.refresh(_reserves)
+            
+            def followSync(self):
+                # only pools that traded since last poll are updated (and only their arcs in pathfinder)
+                _changed = self.reserves.follow([p.contract.address for p in self.pairs])
+                if _changed is None:
+                    return self.refresh()
+                for _pair in self.pairs:
+                    if _pair.contract.address in _changed:
+                        _pair.refresh(_changed[_pair.contract.address])
+                self.tvl = sum([p.RPTRTVL for p in self.pairs])
+                self.graphe.majPaires(_changed)
     
-        def __init__(self, _web3):
+        @dataclass(frozen=True)
+        class PairSnapshot:
+            token0: str
+            token1: str
+            ticker0: str
+            ticker1: str
+            reserve0formatted: float
+            reserve1formatted: float
+        
+        @dataclass(frozen=True)
+        class Snapshot:
+            price: float
+            tvl: float
+            pairs: tuple
+            timestamp: float
+            refreshDuration: float
+            
+            def age(self):
+                return time.time() - self.timestamp
+        
+        def __init__(self, _web3, _session, _rpc, _metadata, _flights):
             self.web3 = _web3
-            self.raptorswap = self.RaptorSwap(_web3)
-            self.price = 0
-            self.tvl = 0
-            self.refresh()
+            self.session = _session
+            self.flights = _flights
+            self.raptorswap = self.RaptorSwap(_web3, _rpc, _metadata)
+            self.snapshot = self.Snapshot(0, 0, (), 0, 0)
+            self.thread = None
+            self.threadLock = threading.Lock() # concurrent first requests start a single refresher
+            self.refresh() # first snapshot is built synchronously, so pages always have one
             
         def refresh(self):
             print("refreshing swap")
+            _start = time.time()
             self.raptorswap.refresh()
+            _price = self.snapshot.price
             try:
-                self.price = float(requests.get("https://api.mobula.io/api/1/market/data?asset=Raptor%20Finance").json().get("data").get("price"))
+                _price = self.flights.do(("price",), self.loadPrice)
             except:
                 pass # keeps former price in case of network error
-            self.tvl = self.raptorswap.tvl
+            self.publish(_price, _start)
+        
+        def loadPrice(self):
+            with metrics.timeUpstream("price-api", "market/data"):
+                return float(self.session.get(PRICE_API, timeout=NODE_TIMEOUT).json().get("data").get("price"))
+        
+        def update(self):
+            # in between full refreshes: reserves from Sync logs, price kept
+            _start = time.time()
+            self.raptorswap.followSync()
+            self.publish(self.snapshot.price, _start)
+        
+        def publish(self, price, start):
+            _pairs = tuple(self.PairSnapshot(p.token0, p.token1, p.ticker0, p.ticker1, p.reserve0formatted, p.reserve1formatted) for p in self.raptorswap.pairs)
+            # published at once, readers either get the former snapshot or this one
+            self.snapshot = self.Snapshot(price, self.raptorswap.tvl, _pairs, time.time(), time.time() - start)
+        
+        def run(self):
+            _lastRefresh = time.time()
+            while True:
+                time.sleep(SYNC_POLL_DELAY)
+                try:
+                    if (time.time() - _lastRefresh) >= (DEFI_REFRESH_DELAY if self.snapshot.price else DEFI_RETRY_DELAY):
+                        _lastRefresh = time.time()
+                        self.refresh()
+                    else:
+                        self.update()
+                except Exception as e:
+                    print(f"DeFi refresh failed: {e.__repr__()}") # former snapshot stays published
+        
+        def start(self):
+            # started lazily (and restarted if needed), a thread started before a fork doesn't exist in worker processes
+            with self.threadLock:
+                if not (self.thread and self.thread.is_alive()):
+                    self.thread = threading.Thread(target=self.run, name="defi-refresher", daemon=True)
+                    self.thread.start()
             
     
-    def __init__(self, node):
+    def __init__(self, node, poolSize=NODE_POOL_SIZE, timeout=NODE_TIMEOUT, retries=NODE_RETRIES):
         self.node = node
-        self.web3 = Web3(HTTPProvider(f"{node}/web3"))
-        self.defi = self.DefiStats(self.web3)
+        self.timeout = timeout
+        self.session = self.makeSession(poolSize, retries)
+        self.web3 = Web3(HTTPProvider(f"{node}/web3", session=self.session, request_kwargs={"timeout": timeout}))
+        self.web3.middleware_onion.add(metrics.web3Middleware("node-web3"))
+        self.rpc = JSONRPCBatch(self.session, f"{node}/web3", timeout)
+        self.batchPool = ThreadPoolExecutor(max_workers=TX_BATCH_WORKERS, thread_name_prefix="txbatch")
+        self.fetchPool = ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS, thread_name_prefix="pagefetch")
+        self.txChunkSize = TX_CHUNK_SIZE
+        self.txChunkSuccesses = 0 # full chunks fetched since the chunk size last changed
+        self.cache = ObjectCache()
+        self.tipHeight = 0 # highest known block height, tells which blocks could still be reorganized
+        self.metadata = metastore.MetadataStore()
+        self.flights = SingleFlight() # identical concurrent fetches (same block, transaction, receipt...) are made once
+        self.defi = self.DefiStats(self.web3, self.session, self.rpc, self.metadata, self.flights)
+        # final blocks and their transactions, indexed locally by `indexer.py`: pages read them from there before asking the node
+        self.index = indexer.ChainIndex() if indexer.INDEX_FILE else None
         self.knownTokens = {}
-        self.lastRefresh = time.time()
         for _addr, _ in TOKENICONURLS.items():
             self.loadToken(_addr)   # makes sure it's known
         for p in self.defi.raptorswap.pairs:
             self.loadToken(p.contract.address)
     
+    def makeSession(self, poolSize, retries):
+        # keep-alive connection pool, so a page render doesn't pay a TCP handshake per node call
+        # POST is retried too, web3 calls made by the explorer are read-only (eth_call, receipts...)
+        _retry = Retry(total=retries, backoff_factor=NODE_RETRY_BACKOFF, status_forcelist=(500, 502, 503, 504), allowed_methods=frozenset(["GET", "POST"]))
+        _adapter = HTTPAdapter(pool_connections=4, pool_maxsize=poolSize, max_retries=_retry)
+        _session = requests.Session()
+        _session.mount("http://", _adapter)
+        _session.mount("https://", _adapter)
+        return _session
+    
+    def nodeResponse(self, path):
+        # timed by route (`/chain/block`, `/get/transactions`...), not by full path
+        with metrics.timeUpstream("node", "/" + "/".join(path.strip("/").split("/")[:2])):
+            return self.session.get(f"{self.node}{path}", timeout=self.timeout)
+    
+    def nodeGet(self, path, default=None):
+        return self.nodeResponse(path).json().get("result", default)
+    
+    def fetchAll(self, *calls):
+        # runs independent fetches, given as (function, args...), concurrently and returns their results in order
+        # the first exception is raised once all of them are done, so none keeps running in the background
+        if threading.current_thread().name.startswith("pagefetch"):
+            return [c[0](*c[1:]) for c in calls] # nested, waiting on the same pool could exhaust it
+        _futures = [tracing.submitInContext(self.fetchPool, *c) for c in calls]
+        wait(_futures)
+        return [f.result() for f in _futures]
+    
+    def cacheTTL(self, height):
+        # recent blocks (and what they contain) could still be reorganized
+        return RECENT_TTL if (height > (self.tipHeight - REORG_DEPTH)) else None
+    
     def loadBlock(self, blockid):
-        _url = f"{self.node}/chain/block/{blockid}" if ((type(blockid) == int) or (blockid.isnumeric())) else f"{self.node}/chain/blockByHash/{blockid}" # depends if we load it by height or hash
-        print(_url)
-        _raw = requests.get(_url).json().get("result", {})
-        return self.Block(_raw)
-        
+        _byHeight = ((type(blockid) == int) or (blockid.isnumeric()))
+        _key = ("block", int(blockid)) if _byHeight else ("block", blockid.lower())
+        _cached = self.cache.get(_key)
+        if _cached:
+            return _cached
+        return self.flights.do(_key, self.fetchBlock, blockid, _byHeight)
+    
+    def fetchBlock(self, blockid, _byHeight):
+        _indexed = self.index and self.index.block(blockid)
+        if _indexed:
+            return self.cacheBlock(_indexed)
+        _path = f"/chain/block/{blockid}" if _byHeight else f"/chain/blockByHash/{blockid}" # depends if we load it by height or hash
+        return self.cacheBlock(self.nodeGet(_path, {}))
+    
+    def cacheBlock(self, _raw):
+        _block = self.Block(_raw)
+        if _raw:
+            self.tipHeight = max(self.tipHeight, _block.height)
+            self.cache.put([("block", _block.height), ("block", _block.proof.lower())], _block, self.cache.estimateSize(_raw), self.cacheTTL(_block.height))
+        return _block
+    
+    def prefetched(self, key):
+        return PREFETCHED.get().get(key)
+    
+    def cacheTransaction(self, _raw):
+        _tx = self.Transaction(_raw)
+        self.cache.put([("tx", _raw["hash"].lower())], _tx, len(_raw["data"]) + 100)
+        return _tx
     
     def loadTransaction(self, txid):
-        _raw = requests.get(f"{self.node}/get/transactions/{txid}").json().get("result")
-        return (self.Transaction(_raw[0]) if len(_raw) else None)
+        _cached = self.cache.get(("tx", txid.lower()))
+        if _cached:
+            return _cached
+        return self.flights.do(("tx", txid.lower()), self.fetchTransaction, txid)
+    
+    def fetchTransaction(self, txid):
+        _indexed = self.index and self.index.transaction(txid)
+        if _indexed:
+            return self.cacheTransaction(_indexed)
+        _raw = self.nodeGet(f"/get/transactions/{txid}")
+        return (self.cacheTransaction(_raw[0]) if len(_raw) else None)
         
     def loadReceipt(self, txid):
-        return self.web3.eth.getTransactionReceipt(txid)
+        _cached = self.cache.get(("receipt", txid.lower()))
+        if _cached:
+            return _cached
+        return self.flights.do(("receipt", txid.lower()), self.fetchReceipt, txid)
+    
+    def fetchReceipt(self, txid):
+        return self.cacheReceipt(txid, self.web3.eth.getTransactionReceipt(txid))
+    
+    def cacheReceipt(self, txid, _receipt):
+        self.cache.put([("receipt", txid.lower())], _receipt, self.cache.estimateSize(_receipt), self.cacheTTL(_receipt.get("blockNumber") or self.tipHeight))
+        return _receipt
         
-    def cutIntoChunks(self, _list, _chunkSize):
+    def cutIntoChunks(self, _list, _chunkSize, _maxLength=None):
+        # chunks of at most `_chunkSize` items, and at most `_maxLength` chars once joined with commas
         _chunks = []
-        while len(_list):
-            # adds chunk to chunks
-            _chunks.append(_list[0:_chunkSize])
-            _list = _list[_chunkSize:]  # removes elements from list (to avoid counting them twice)
+        _current = []
+        _length = 0
+        for _item in _list:
+            if len(_current) and ((len(_current) >= _chunkSize) or (_maxLength and ((_length + len(_item) + 1) > _maxLength))):
+                _chunks.append(_current)
+                (_current, _length) = ([], 0)
+            _current.append(_item)
+            _length += len(_item) + 1
+        if len(_current):
+            _chunks.append(_current)
         return _chunks
         
     def loadChunkOfTransactions(self, _chunk):
+        if not len(_chunk):
+            return []
         formattedTxids = ",".join(_chunk)
-        _url = f"{self.node}/get/transactions/{formattedTxids}"
-        return requests.get(_url).json().get("result") if len(_chunk) else []
-        
+        # connection errors and timeouts are raised as they are: smaller chunks wouldn't fare better against a node that's down
+        _resp = self.nodeResponse(f"/get/transactions/{formattedTxids}")
+        try:
+            if not _resp.status_code in (413, 414):
+                _txs = _resp.json().get("result") or []
+                self.chunkFetched(len(_chunk))
+                return _txs
+        except ValueError:
+            if _resp.status_code != 200:
+                raise # error page (502...), not a size problem
+        if len(_chunk) == 1:
+            _resp.raise_for_status()
+            raise ValueError(f"truncated response for transaction {_chunk[0]}")
+        # URL or response too large (413/414, or a truncated body) - splits it and uses smaller chunks for a while
+        self.txChunkSize = max(min(self.txChunkSize, len(_chunk)//2), 1)
+        self.txChunkSuccesses = 0
+        _half = len(_chunk)//2
+        return self.loadChunkOfTransactions(_chunk[:_half]) + self.loadChunkOfTransactions(_chunk[_half:])
+    
+    def chunkFetched(self, _length):
+        # chunk size grows back once full chunks went through for a while (the node's limit may have been temporary)
+        if (self.txChunkSize < TX_CHUNK_SIZE) and (_length >= self.txChunkSize):
+            self.txChunkSuccesses += 1
+            if self.txChunkSuccesses >= TX_CHUNK_GROW_AFTER:
+                (self.txChunkSize, self.txChunkSuccesses) = (min(self.txChunkSize * 2, TX_CHUNK_SIZE), 0)
+    
+    def loadSharedChunk(self, _chunk):
+        # visitors of the same block page ask for the same chunks at the same time
+        return self.flights.do(("txs", tuple(_chunk)), self.loadChunkOfTransactions, _chunk)
+    
+    def txidChunks(self, txids):
+        # chunks of txids for `/get/transactions/`, within the node's URL length limit
+        _maxLength = NODE_MAX_URL - len(f"{self.node}/get/transactions/")
+        return self.cutIntoChunks(txids, self.txChunkSize, _maxLength)
+    
+    def loadRawTransactions(self, txids):
+        # chunks are fetched concurrently, returns raw transactions by hash
+        _raws = {}
+        for _chunkRaws in tracing.mapInContext(self.batchPool, self.loadSharedChunk, self.txidChunks(txids)):
+            for _raw in _chunkRaws:
+                _raws[_raw["hash"]] = _raw
+        return _raws
+    
+    def loadDeposit(self, txid):
+        try:
+            return self.Deposit(self.web3.eth.getTransaction(txid))
+        except TransactionNotFound:
+            return None # not known by web3 either, skipped (like before) - timeouts and connection errors are raised
+    
     def loadBatchOfTransactions(self, txids):
-        _raws = []
-        _chunks = self.cutIntoChunks(txids, 10)
-        for chk in _chunks:
-            _raws = _raws + self.loadChunkOfTransactions(chk)
+        _found = {}
+        for h in txids:
+            _cached = self.cache.get(("tx", h.lower()))
+            if _cached:
+                _found[h] = _cached
+        
+        # indexed ones come back as IndexedTransaction (what lists show), not decoded again
+        if self.index:
+            _found.update(self.index.transactions([h for h in txids if not h in _found]))
         
-        # as `/get/transactions/` only returns actual transactions, cross-chain deposits will need to be fetched separately
-        _receivedHashes = [t["hash"] for t in _raws]
-        _missingHashes = filter((lambda h: not h in _receivedHashes), txids)
+        _toFetch = [h for h in dict.fromkeys(txids) if not h in _found]
+        for h, _raw in self.loadRawTransactions(_toFetch).items():
+            _found[h] = self.cacheTransaction(_raw)
         
-        return [self.Transaction(_raw) for _raw in _raws]
+        # as `/get/transactions/` only returns actual transactions, cross-chain deposits need to be fetched separately
+        _missingHashes = [h for h in _toFetch if not h in _found]
+        for h, _deposit in zip(_missingHashes, tracing.mapInContext(self.batchPool, self.loadDeposit, _missingHashes)):
+            if _deposit:
+                _found[h] = _deposit
+        
+        # keeps the order of `txids`
+        return [_found[h] for h in txids if h in _found]
+    
+    def unindexedTail(self, txids):
+        # newest txids of `txids` (oldest first, as served by the node) that aren't indexed yet, newest first
+        _tail = []
+        for _end in range(len(txids), 0, -INDEX_TAIL_CHUNK):
+            _chunk = txids[max(_end - INDEX_TAIL_CHUNK, 0):_end]
+            _indexed = self.index.transactions(_chunk)
+            for h in reversed(_chunk):
+                if h in _indexed:
+                    return _tail # blocks are indexed in order, older ones are all indexed
+                _tail.append(h)
+        return _tail
     
     def loadAccount(self, address):
-        _raw = requests.get(f"{self.node}/accounts/accountInfo/{address}").json().get("result")
-        _tokens = self.tokenHoldings(w3.toChecksumAddress(address))
+        _prefetched = self.prefetched(("account", address.lower()))
+        if _prefetched:
+            return _prefetched
+        (_raw, _tokens) = self.fetchAll((self.nodeGet, f"/accounts/accountInfo/{address}"), (self.tokenHoldings, w3.toChecksumAddress(address)))
         return self.Account(_raw, _tokens)
         
+    def loadBalance(self, address):
+        # balance only (no token scan)
+        return self.nodeGet(f"/accounts/accountInfo/{address}").get("balance", 0)
+    
+    def loadNetworkStats(self, burnAddress):
+        (_stats, _burned) = self.fetchAll((self.loadStats,), (self.loadBalance, burnAddress))
+        _defi = self.defi.snapshot
+        return self.NetworkStats(_stats.supply, _burned, _stats.holders, _stats.chainLength, _stats.blocks, _defi.price, _defi.tvl, _defi.timestamp)
+    
     def loadToken(self, tokenAddr):
         _parsedAddr = w3.toChecksumAddress(tokenAddr)
         if not self.knownTokens.get(_parsedAddr):
-            self.knownTokens[_parsedAddr] = self.Token(self.web3.eth.contract(address=_parsedAddr, abi=ERC20ABI))
+            self.knownTokens[_parsedAddr] = self.Token(self.web3.eth.contract(address=_parsedAddr, abi=ERC20ABI), self.metadata)
         return self.knownTokens.get(_parsedAddr)
         
     def tokenHoldings(self, holder):
+        # a single JSON-RPC batch of balanceOf eth_calls, whatever the number of known tokens
+        (_tokens, _calls) = self.tokenHoldingsCalls(holder)
+        return self.decodeHoldings(_tokens, _calls, self.rpc.call(_calls))
+    
+    def tokenHoldingsCalls(self, holder):
+        _tokens = list(self.knownTokens.keys())
+        _calldata = BALANCEOF_SELECTOR + ("0" * 24) + holder.lower().replace("0x", "")
+        return (_tokens, [("eth_call", [{"to": addr, "data": _calldata}, "latest"]) for addr in _tokens])
+    
+    def decodeHoldings(self, _tokens, _calls, _results):
+        # a failed call (None, a zero balance is "0x00...") is retried once, then kept with a None balance (shown as unavailable)
+        _results = list(_results)
+        _failed = [i for i, _result in enumerate(_results) if _result is None]
+        if len(_failed):
+            for i, _result in zip(_failed, self.rpc.call([_calls[i] for i in _failed])):
+                _results[i] = _result
         _holdings = {}
-        for addr, tkn in self.knownTokens.items():
-            _bal = tkn.contract.functions.balanceOf(holder).call()
-            if _bal:    # only show nonzero
+        for addr, _result in zip(_tokens, _results):
+            _bal = None if (_result is None) else self.rpc.decodeUint(_result)
+            if _bal != 0:    # only show nonzero (and unavailable ones)
                 _holdings[addr] = _bal
         return _holdings
     
@@ -520,26 +1120,32 @@ class RaptorChainPuller(object):
             return acct.balance > 0
         else: # assumes it's a standard ERC20 token
             tkn = w3.toChecksumAddress(tkn)
+            if acct.tokens[tkn] is None:
+                raise ValueError(f"balanceOf call failed for token {tkn}")
             return acct.tokens[tkn] > 0
     
     def getLastNTxs(self, n):
-        _raw = requests.get(f"{self.node}/get/nLastTxs/{n}").json().get("result")
-        return [self.Transaction(_rawtx) for _rawtx in _raw]
+        _raw = self.prefetched(("lastTxs", n)) or self.nodeGet(f"/get/nLastTxs/{n}")
+        return [self.cacheTransaction(_rawtx) for _rawtx in _raw]
         
     def loadStats(self):
-        _raw = requests.get(f"{self.node}/stats").json().get("result")
-        return self.Stats(_raw)
+        _raw = self.nodeGet("/stats")
+        _stats = self.Stats(_raw)
+        self.tipHeight = max(self.tipHeight, _stats.chainLength - 1)
+        return _stats
         
     def refresh(self):
-        if (((time.time() - self.lastRefresh) >= 300) or (self.defi.price == 0)): # refresh if time elapsed > 5m OR if price is invalid
-            self.lastRefresh = time.time()
-            self.defi.refresh()
+        # never blocks, DeFi data is refreshed in background (every 5m, or sooner while price is invalid)
+        self.defi.start()
         
 class RaptorChainExplorer(object):
+    class CursorNotFound(Exception):
+        pass # paging cursor isn't in the list (anymore)
+    
     def __init__(self):
         self.timestampFormatScript = """<script>function formatBkTimestamp(tme) { return (new Date(tme * 1000)).toLocaleString(); }</script>"""
     
-        self.puller = RaptorChainPuller("http://127.0.0.1:4242/")
+        self.puller = RaptorChainPuller(NODE_URL)
         # self.puller = RaptorChainPuller("https://rpc.raptorchain.io")
         self.ticker = "RPTR"
         self.testnet = False
@@ -549,7 +1155,8 @@ class RaptorChainExplorer(object):
         self.chainExplorers = {56: "https://bscscan.com/", 137: "https://polygonscan.com/", 250: "https://ftmscan.com/"}
         self.publicNode = "https://rpc.raptorchain.io/"
         self.burnAddress = "0x000000000000000000000000000000000000dead"
-        self.onlyLastTxs = False
+        # shared by every page (navbar), refreshed in background once older than NETWORK_STATS_TTL
+        self.networkStats = StaleWhileRevalidate(lambda: self.puller.loadNetworkStats(self.burnAddress), NETWORK_STATS_TTL)
 
     def formatAmount(self, rawAmount):
         _withoutDecimals = rawAmount / (10**self.decimals)
@@ -738,16 +1345,13 @@ class RaptorChainExplorer(object):
 
     def TransfersCard(self, _events):
         _transfers = transferParser.parseEventList(_events)
-        _body = ""
-        for _t in _transfers:
-            _body = _body + self.TransferDiv(_t)
+        self.puller.fetchAll(*[(self.puller.loadToken, _token) for _token in set(_t.token for _t in _transfers)]) # unknown tokens are loaded at once
         return f"""<div class="transfersCard">
-            {_body}
+            {"".join(self.TransferDiv(_t) for _t in _transfers)}
         </div>"""
     
     def TransactionCard(self, txid):
-        txObject = self.puller.loadTransaction(txid)
-        txReceipt = self.puller.loadReceipt(txid)
+        (txObject, txReceipt) = self.puller.fetchAll((self.puller.loadTransaction, txid), (self.puller.loadReceipt, txid))
         try:
             parsed = methodParser.decode(txObject.data)
         except Exception as e:
@@ -770,7 +1374,7 @@ class RaptorChainExplorer(object):
                     <div>Gas limit : {txObject.gasLimit}</div>
                     <div>Gas used : {gasUsed} ({((gasUsed * 100)//txObject.gasLimit) if txObject.gasLimit else 0}%)</div>
                     <div>Gas price : {txObject.gasprice / 10**9} gwei</div>
-                    <div>Fees paid : {_feesPaid/10**18} RPTR ({round((_feesPaid/10**18) * self.puller.defi.price, 3)}$)</div>
+                    <div>Fees paid : {_feesPaid/10**18} RPTR ({round((_feesPaid/10**18) * self.puller.defi.snapshot.price, 3)}$)</div>
                     <div>Fees burned &#x1f525; : {(_feesPaid//2)/10**18} RPTR (50%)</div>
                 </div>
                 <h2>Token Transfers</h2>
@@ -790,49 +1394,56 @@ class RaptorChainExplorer(object):
             </div>
         """
 
-    def BlockCard(self, bkid):
+    def BlockCard(self, bkid, limit=TXS_PAGE_SIZE, cursor=None):
+        # block is loaded right away (a missing one fails the request with a proper status),
+        # returns a generator (see pageStream): transactions are loaded as their rows are sent
         block = self.puller.loadBlock(bkid)
-        return f"""
-            {self.timestampFormatScript}
-            <h3 class="cardTitle">{f"Beacon block {block.height}" if block.height else "Genesis Block"}</h3>
-            <div class="cardContainer" id="blockCard">
-                <div>
-                    <div>Miner/staker : <a href="/address/{block.miner}">{block.miner}</a></div>
-					<div>Hash : {block.proof}</div>
-                    <div>Timestamp : <span id="blockTimestamp">{block.timestamp}<span></div>
-                    <h4>Cross-Chain Messages</h4>
-                        {self.messagesMapped(block.decodedMessages)}
-                    <h4>Transactions</h4>
-                        {self.txsMapped(list(reversed(block.transactions)))}
+        (_pageTxids, _nextCursor) = self.blockTxsPage(block, limit, cursor)
+        def _pieces():
+            yield f"""
+                {self.timestampFormatScript}
+                <h3 class="cardTitle">{f"Beacon block {block.height}" if block.height else "Genesis Block"}</h3>
+                <div class="cardContainer" id="blockCard">
+                    <div>
+                        <div>Miner/staker : <a href="/address/{block.miner}">{block.miner}</a></div>
+    					<div>Hash : {block.proof}</div>
+                        <div>Timestamp : <span id="blockTimestamp">{block.timestamp}<span></div>
+                        <h4>Cross-Chain Messages</h4>
+                            {self.messagesMapped(block.decodedMessages)}
+                        <h4>Transactions ({len(block.transactions)})</h4>
+                            """
+            yield from self.txsStream(_pageTxids)
+            yield f"""
+                            {self.pagerLinks(f"/block/{bkid}", limit, cursor, _nextCursor)}
+                    </div>
                 </div>
-            </div>
-            <script>
-                document.getElementById("blockTimestamp").innerHTML = formatBkTimestamp({block.timestamp});
-            </script>
-        """
+                <script>
+                    document.getElementById("blockTimestamp").innerHTML = formatBkTimestamp({block.timestamp});
+                </script>
+            """
+        return _pieces()
     
     def refactortable(self, columns):
         lines = [l.copy() for l in ([[]] * len(columns[0]))]
         for columnid in range(len(columns)):
             for lineid in range(len(lines)):
                 lines[lineid].append(columns[columnid][lineid])
-        print(lines)
         return lines
     
     
     def renderTable(self, lines=[], columns=None, elementid=None):
+        return "".join(self.tableStream(lines, columns, elementid))
+    
+    def tableStream(self, lines=[], columns=None, elementid=None):
+        # yields the table row by row, `lines` can be a generator (rows are sent as they come when streamed)
         if columns:
             lines = self.refactortable(columns)
-        fmtLines = []
-        for line in lines:
-            fmtLines.append("<tr>" + ("".join([f"<td>{v}</td>" for v in line])) + "</tr>")
-            
-        
-            
-    
-        return f"""<table {f"id={elementid}" if elementid else ""}>
+        yield f"""<table {f"id={elementid}" if elementid else ""}>
             <tbody>
-                {"".join(fmtLines)}
+                """
+        for line in lines:
+            yield "<tr>" + ("".join([f"<td>{v}</td>" for v in line])) + "</tr>"
+        yield """
             </tbody>
         </table>"""
     
@@ -847,46 +1458,111 @@ class RaptorChainExplorer(object):
         return self.renderTable(lines=mappable)
         
     def txsMapped(self, txids):
-        print(txids)
-        txs = self.puller.loadBatchOfTransactions(txids)
-        mappable = [["Hash", "Value", "Sender", "Recipient"]] + [[f'<a href="/tx/{tx.txid}">{tx.txid[:48]}...</a>', f"{self.formatAmount(tx.value)} {self.ticker}", f"<a href=/address/{tx.sender}>{tx.sender}</a>", f"<a href=/address/{tx.recipient}>{tx.recipient}</a>"] for tx in txs]
-        return self.renderTable(lines=mappable)
+        return "".join(self.txsStream(txids, (len(txids) or 1))) # loaded in a single batch
         # return ("<ul>" + ("".join([f'<li><a href="/tx/{txid}">{txid}</a></li>' for txid in txids])) + "</ul>")
+    
+    def txsStream(self, txids, chunkSize=STREAM_CHUNK):
+        return self.tableStream(lines=self.txsLines(txids, chunkSize))
+    
+    def txsLines(self, txids, chunkSize):
+        yield ["Hash", "Value", "Sender", "Recipient"]
+        for _chunk in self.puller.cutIntoChunks(txids, chunkSize):
+            for tx in self.puller.loadBatchOfTransactions(_chunk):
+                yield [f'<a href="/tx/{tx.txid}">{tx.txid[:48]}...</a>', f"{self.formatAmount(tx.value)} {self.ticker}", f"<a href=/address/{tx.sender}>{tx.sender}</a>", f"<a href=/address/{tx.recipient}>{tx.recipient}</a>"]
         
-    def blocksTable(self, bkids):
-        blocks = [["Height", "Hash", "Timestamp", "Miner"]] + [[f'<a href="/block/{bk.height}">{bk.height}</a>', f'<a href="/block/{bk.proof}">{bk.proof}</a>', f"{self.formatTime(time.time() - bk.timestamp)} ago", f'<a href="/address/{bk.miner}">{bk.miner}</a>'] for bk in [self.puller.loadBlock(bkid) for bkid in bkids]]
+    def blocksTable(self, _blocks):
+        blocks = [["Height", "Hash", "Timestamp", "Miner"]] + [[f'<a href="/block/{bk.height}">{bk.height}</a>', f'<a href="/block/{bk.proof}">{bk.proof}</a>', f"{self.formatTime(time.time() - bk.timestamp)} ago", f'<a href="/address/{bk.miner}">{bk.miner}</a>'] for bk in _blocks]
         return self.renderTable(lines=blocks)
         
         
     def blocksMapped(self, bkids):
         return ("<ul>" + ("".join([f'<li><a href="/block/{bkid}">{bkid}</a></li>' for bkid in bkids])) + "</ul>")
 
+    def tokenHoldingsRow(self, tkn, bal):
+        _tknInfo = self.puller.loadToken(tkn)
+        _icon = " " + self.icon(TOKENICONURLS.get(tkn), 10) if TOKENICONURLS.get(tkn) else ""
+        _amount = "unavailable" if (bal is None) else bal/(10**_tknInfo.decimals)
+        return f"""<div class="tokenHoldingsRow">{_amount} <a href="/token/{tkn}">{_tknInfo.symbol}{_icon}</a></div>"""
+    
     def tokenHoldingsDiv(self, _tokens):
-        _body = ""
-        for tkn, bal in _tokens.items():
-            _tknInfo = self.puller.loadToken(tkn)
-            _icon = " " + self.icon(TOKENICONURLS.get(tkn), 10) if TOKENICONURLS.get(tkn) else ""
-            _body = _body + f"""<div class="tokenHoldingsRow">{bal/(10**_tknInfo.decimals)} <a href="/token/{tkn}">{_tknInfo.symbol}{_icon}</a></div>"""
         return f"""<div class="tokenHoldings">
-            {_body}
+            {"".join(self.tokenHoldingsRow(tkn, bal) for tkn, bal in _tokens.items())}
         </div>"""
 
-    def AccountCard(self, address):
+    def txsPage(self, txids, limit, cursor=None, position=None):
+        # keyset paging over `txids` (oldest first, as served by the node), newest first: the `limit` txids older than
+        # `cursor` (last txid of the previous page, at `position` in `txids` if known), and the cursor of the next page
+        _end = len(txids)
+        if cursor:
+            _end = position if (position is not None) else self.cursorPosition(txids, cursor)
+        _page = txids[max(_end - limit, 0):_end][::-1]
+        return (_page, (_page[-1] if (_end > limit) else None))
+    
+    def cursorPosition(self, txids, cursor):
+        try:
+            return txids.index(cursor) # as linked by pagerLinks
+        except ValueError:
+            _cursor = cursor.lower()
+            _position = next((i for i, h in enumerate(txids) if h.lower() == _cursor), None)
+            if _position is None:
+                raise self.CursorNotFound(cursor) # going back to the first page would loop a client walking older pages
+            return _position
+    
+    def blockTxsPage(self, block, limit, cursor=None):
+        # with the index, the cursor's position in the block is read from it instead of searched for
+        _indexed = cursor and self.puller.index and self.puller.index.position(cursor)
+        if _indexed and (_indexed[0] == block.height) and (_indexed[1] < len(block.transactions)) and (block.transactions[_indexed[1]].lower() == cursor.lower()):
+            return self.txsPage(block.transactions, limit, cursor, _indexed[1])
+        return self.txsPage(block.transactions, limit, cursor)
+    
+    def accountTxsPage(self, address, txids, limit, cursor=None):
+        # like txsPage, for an account's txids (oldest first, as served by the node): with the index, only the newest ones
+        # it doesn't have yet are paged in memory, older ones are read from it (keyset on height and position)
+        if not self.puller.index:
+            return self.txsPage(txids, limit, cursor)
+        _tail = self.puller.unindexedTail(txids)
+        (_start, _before) = (0, None)
+        if cursor:
+            _start = next((i + 1 for i, h in enumerate(_tail) if h.lower() == cursor.lower()), None)
+            if _start is None:
+                _before = self.puller.index.accountPosition(address, cursor)
+                if not _before:
+                    raise self.CursorNotFound(cursor)
+                _start = len(_tail)
+        _page = _tail[_start:_start + limit + 1]
+        if len(_page) <= limit:
+            _page += self.puller.index.accountTransactions(address, limit + 1 - len(_page), _before)
+        return (_page[:limit], (_page[limit - 1] if (len(_page) > limit) else None))
+    
+    def pagerLinks(self, path, limit, cursor, nextCursor):
+        _links = []
+        if cursor:
+            _links.append(f'<a href="{path}?limit={limit}">&laquo; Newest</a>')
+        if nextCursor:
+            _links.append(f'<a href="{path}?limit={limit}&cursor={nextCursor}">Older &raquo;</a>')
+        return f"""<div class="pager">{" | ".join(_links)}</div>"""
+    
+    def AccountCard(self, address, limit=TXS_PAGE_SIZE, cursor=None):
+        # account is loaded right away, returns a generator (like BlockCard)
         acctObject = self.puller.loadAccount(address)
-        _txids = list(reversed(acctObject.transactions[1:]))
-        if self.onlyLastTxs:
-            _txids = _txids[:25]
-        return f"""
-            <h3 class="cardTitle">Account {address}</h3>
-			<div class="cardContainer">
-				<div>Balance : {acctObject.balance / (10**18)} {self.ticker}</div>
-				<div>Nonce : {acctObject.nonce}</div>
-                <h2>Token Holdings</h2>
-                <div>{self.tokenHoldingsDiv(acctObject.tokens)}</div>
-				<h4>Transaction history</h4>
-				{self.txsMapped(_txids)}
-			</div>
-        """
+        _txids = acctObject.transactions[1:]
+        (_pageTxids, _nextCursor) = self.accountTxsPage(address, _txids, limit, cursor)
+        def _pieces():
+            yield f"""
+                <h3 class="cardTitle">Account {address}</h3>
+    			<div class="cardContainer">
+    				<div>Balance : {acctObject.balance / (10**18)} {self.ticker}</div>
+    				<div>Nonce : {acctObject.nonce}</div>
+                    <h2>Token Holdings</h2>
+                    <div>{self.tokenHoldingsDiv(acctObject.tokens)}</div>
+    				<h4>Transaction history ({len(_txids)})</h4>
+    				"""
+            yield from self.txsStream(_pageTxids)
+            yield f"""
+    				{self.pagerLinks(f"/address/{address}", limit, cursor, _nextCursor)}
+    			</div>
+            """
+        return _pieces()
         
     def TokenCard(self, address):
         tokenObject = self.puller.loadToken(address)
@@ -912,10 +1588,12 @@ class RaptorChainExplorer(object):
         """
         
     def RaptorSwapCard(self):
-        _cards = "".join([self.SwapPairCard(p) for p in self.puller.defi.raptorswap.pairs])
+        _snapshot = self.puller.defi.snapshot
+        _cards = "".join([self.SwapPairCard(p) for p in _snapshot.pairs])
         return f"""
 			<div class="cardContainer">
                 <h2>RaptorSwap</h2>
+                <div>Updated {self.formatTime(_snapshot.age())} ago</div>
                 {_cards}
             </div>
         """
@@ -939,16 +1617,19 @@ class RaptorChainExplorer(object):
         """
 
     def homepageCard(self):
+        # last transactions and blocks are fetched concurrently
+        _heights = list(reversed(self.networkStats.get().blocks))
+        (_lastTxs, *_blocks) = self.puller.fetchAll((self.puller.getLastNTxs, 10), *[(self.puller.loadBlock, h) for h in _heights])
         return f"""
 			<font class="cardTitle" size=10>RaptorChain {'Testnet' if self.testnet else 'Mainnet'} Explorer</font>
             <div class="cardContainer">
                 <font size=6>Last 10 transactions</font>
                 <div id="txsContainerHomepage">
-                    {self.txsMapped(list(reversed([_tx.txid for _tx in self.puller.getLastNTxs(10)])))}
+                    {self.txsMapped(list(reversed([_tx.txid for _tx in _lastTxs])))}
                 </div>
                 <font size=6>Last 10 beacon blocks</font>
                 <div id="blocksContainerHomepage">
-                    {self.blocksTable(list(reversed([height for height in self.puller.loadStats().blocks])))}
+                    {self.blocksTable(_blocks)}
                 </div>
 				<script src="/homePageScripts.js"></script>
             </div>
@@ -956,14 +1637,13 @@ class RaptorChainExplorer(object):
 
 
     def networkStatsCard(self):
-        stats = self.puller.loadStats()
-        burned = self.puller.loadAccount(self.burnAddress).balance
+        stats = self.networkStats.get()
         return f"""
 			<div class="networkStats">
 				<div>
 
 					<div>{self.ticker} on mainnet : {self.formatAmount(stats.supply)} {self.ticker}</div>
-					<div>Total gas burned &#x1f525; : {self.formatAmount(burned)} {self.ticker}</div>
+					<div>Total gas burned &#x1f525; : {self.formatAmount(stats.burned)} {self.ticker}</div>
 					<div>Holders : {stats.holders}</div>
 					<div>Chain length : {stats.chainLength}</div>
 				</div>
@@ -971,8 +1651,9 @@ class RaptorChainExplorer(object):
 			<div class="networkStats" style="margin-right: 3px">
 				<div>
 					<div><font size=6><a href="/defi">Raptor DeFi</a></font></div>
-					<div>Raptor Price : <a href="https://mobula.fi/asset/raptor-finance">{"{price:.7f}".format(price=self.puller.defi.price)}$</a></div>
-					<div>TVL : {int(self.puller.defi.tvl)} RPTR</div>
+					<div>Raptor Price : <a href="https://mobula.fi/asset/raptor-finance">{"{price:.7f}".format(price=stats.price)}$</a></div>
+					<div>TVL : {int(stats.tvl)} RPTR</div>
+					<div><font size=2>updated {self.formatTime(time.time() - stats.defiTimestamp)} ago</font></div>
 				</div>
 			</div>
         """
@@ -1116,8 +1797,12 @@ class RaptorChainExplorer(object):
 		
 		
     def pageTemplate(self, subtemplate, pageTitle="RaptorChain Explorer"):
+        return "".join(self.pageStream(subtemplate, pageTitle))
+    
+    def pageStream(self, subtemplate, pageTitle="RaptorChain Explorer"):
+        # `subtemplate` is a string, or a generator of strings: pieces are sent as they're rendered when streamed
         self.puller.refresh()
-        return f"""
+        yield f"""
             <html>
 				<head>
 					<title>{pageTitle}</title>
@@ -1139,7 +1824,12 @@ class RaptorChainExplorer(object):
                         <div style="width: 2%; height: 1;"></div>
                         <div style="display: inline-block;">
 							<div>
-								{subtemplate}
+								"""
+        if isinstance(subtemplate, str):
+            yield subtemplate
+        else:
+            yield from subtemplate
+        yield f"""
 							</div>
                         </div>
                     </div>
@@ -1155,19 +1845,69 @@ class RaptorChainExplorer(object):
 app = flask.Flask(__name__)
 app.config["DEBUG"] = False
 CORS(app)
+
+@app.before_request
+def startRequestTimer():
+    flask.g.requestStart = flask.request.environ.get("explorer.requestStart", time.perf_counter()) # set earlier by the ASGI mode
+    tracing.start(flask.request.method, flask.request.full_path.rstrip("?"), flask.request.url_rule.rule if flask.request.url_rule else "<unmatched>")
+
+def finishRequest(start, rule, method, status):
+    # labelled by route rule (`/block/<bkid>`), not by path, keeps the number of series bounded
+    metrics.REQUEST_DURATION.observe(time.perf_counter() - start, rule, method, str(status))
+    return tracing.finish(status)
+
+@app.after_request
+def observeRequest(response):
+    _args = (flask.g.get("requestStart", time.perf_counter()), (flask.request.url_rule.rule if flask.request.url_rule else "<unmatched>"), flask.request.method, response.status_code)
+    if response.is_streamed:
+        # body is rendered after this hook, observed (and its trace kept, without header) once sent
+        response.call_on_close(lambda: finishRequest(*_args))
+        return response
+    _trace = finishRequest(*_args)
+    if _trace:
+        response.headers["X-Upstream-Calls"] = _trace.summary()
+        if _trace.overBudget():
+            response.headers["X-Upstream-Budget"] = f"exceeded ({len(_trace.calls)} > {tracing.CALL_BUDGET})"
+    return response
+
+
 explorer = RaptorChainExplorer()
 
+metrics.REGISTRY.callbackCounter("explorer_cache_lookups_total", "Object cache (blocks, transactions, receipts) lookups", lambda: {("hit",): explorer.puller.cache.hits, ("miss",): explorer.puller.cache.misses}, ("result",))
+metrics.REGISTRY.gauge("explorer_cache_hit_ratio", "Object cache hit ratio since startup", lambda: explorer.puller.cache.stats()["hitRatio"])
+metrics.REGISTRY.gauge("explorer_cache_entries", "Objects in cache", lambda: len(explorer.puller.cache.entries))
+metrics.REGISTRY.gauge("explorer_cache_bytes", "Estimated size of cached objects", lambda: explorer.puller.cache.size)
+metrics.REGISTRY.callbackCounter("explorer_cache_evictions_total", "Objects evicted from cache since startup", lambda: explorer.puller.cache.evictions)
+metrics.REGISTRY.gauge("explorer_defi_refresh_duration_seconds", "Duration of the last DeFi refresh (full or from Sync logs)", lambda: explorer.puller.defi.snapshot.refreshDuration)
+metrics.REGISTRY.gauge("explorer_defi_snapshot_age_seconds", "Age of the published DeFi snapshot", lambda: explorer.puller.defi.snapshot.age())
+metrics.REGISTRY.gauge("explorer_network_stats_age_seconds", "Age of the navbar network stats", lambda: explorer.networkStats.age())
+
+def loadTotalSupply():
+    global CACHED_SUPPLY, LAST_SUPPLY_REFRESH
+    CACHED_SUPPLY = RPTR_CONTRACT_BSC.functions.totalSupply().call()/1e18
+    LAST_SUPPLY_REFRESH = time.time()
+    return CACHED_SUPPLY
+
 @app.route("/totalSupply")
 def getTotalSupply():
     if (time.time() - LAST_SUPPLY_REFRESH) < SUPPLY_REFRESH_DELAY:
         return str(CACHED_SUPPLY)
-    CACHED_SUPPLY = RPTR_CONTRACT_BSC.functions.totalSupply().call()/1e18
-    return str(CACHED_SUPPLY)
+    return str(explorer.puller.flights.do(("totalSupply",), loadTotalSupply))
+
+@app.route("/metrics")
+def getMetrics():
+    return flask.Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/debug/traces")
+def getTraces():
+    if not tracing.TRACING_ENABLED:
+        flask.abort(404)
+    return tracing.renderPage()
 
 @app.route("/RPTRPrice")
 def getRPTRPrice():
     explorer.puller.refresh()
-    return str(explorer.puller.defi.price)
+    return str(explorer.puller.defi.snapshot.price)
 
 @app.route("/pageScripts.js")
 def getPageScripts():
@@ -1190,9 +1930,46 @@ def getHomePageScripts():
 def getStyleSheets():
     return explorer.styleSheets()
 
+def pageArgs():
+    # `?limit=...&cursor=...` of paged transaction lists
+    try:
+        _limit = min(max(int(flask.request.args.get("limit", TXS_PAGE_SIZE)), 1), TXS_PAGE_MAX)
+    except ValueError:
+        _limit = TXS_PAGE_SIZE
+    return (_limit, flask.request.args.get("cursor"))
+
+def cursorNotFound(path):
+    _message = f"""<div class="cardContainer">This page of transactions doesn't exist (unknown cursor). <a href="{path}">Newest transactions</a></div>"""
+    return flask.Response(explorer.pageTemplate(_message), status=400, mimetype="text/html")
+
+def closeOpenTags(_sent, _error):
+    # tables (only ever inside divs) and divs the page left open when it failed, closed around the error message
+    _openTables = _sent.count("<table") - _sent.count("</table>")
+    _openDivs = _sent.count("<div") - _sent.count("</div>")
+    return ("</tbody></table>" * max(_openTables, 0)) + _error + ("</div>" * max(_openDivs, 0))
+
+def streamedPage(subtemplate, pageTitle):
+    if not STREAM_PAGES:
+        return explorer.pageTemplate(subtemplate, pageTitle)
+    def _pieces():
+        _sent = []
+        try:
+            for _piece in explorer.pageStream(subtemplate, pageTitle):
+                _sent.append(_piece)
+                yield _piece
+        except Exception as e:
+            # status is already sent, ends the page with an error instead of cutting the connection
+            print(f"Render failed: {e.__repr__()}")
+            yield closeOpenTags("".join(_sent), """<div class="renderError">Error while rendering this page, please retry later</div>""") + "</body></html>"
+    return flask.Response(flask.stream_with_context(_pieces()), mimetype="text/html")
+
 @app.route("/block/<bkid>")
 def block(bkid):
-    return explorer.pageTemplate(explorer.BlockCard(bkid), f"RaptorChain block {bkid}")
+    try:
+        _card = explorer.BlockCard(bkid, *pageArgs())
+    except RaptorChainExplorer.CursorNotFound:
+        return cursorNotFound(f"/block/{bkid}")
+    return streamedPage(_card, f"RaptorChain block {bkid}")
 
 @app.route("/tx/<txid>")
 def tx(txid):
@@ -1200,7 +1977,11 @@ def tx(txid):
     
 @app.route("/address/<addr>")
 def address(addr):
-    return explorer.pageTemplate(explorer.AccountCard(addr), f"RaptorChain address {addr}")
+    try:
+        _card = explorer.AccountCard(addr, *pageArgs())
+    except RaptorChainExplorer.CursorNotFound:
+        return cursorNotFound(f"/address/{addr}")
+    return streamedPage(_card, f"RaptorChain address {addr}")
 
 @app.route("/token/<addr>")
 def token(addr):
@@ -1213,14 +1994,29 @@ def defi():
 @app.route("/swappath/<srctoken>/<desttoken>")
 def swappath(srctoken, desttoken):
     srctoken = w3.toChecksumAddress(srctoken)
-    desttoken = w3.toChecksumAddress(srctoken)
-    print(pathfinder.graph.graph)
+    desttoken = w3.toChecksumAddress(desttoken)
     try:
         path = explorer.puller.defi.raptorswap.path(srctoken, desttoken)
-        return json.dumps({"success": True, "result": path})
     except Exception as e:
-        raise
+        print(f"Path lookup failed: {e.__repr__()}")
         return json.dumps({"success": False, "message": "Error fetching path"})
+    if path is None:
+        return json.dumps({"success": False, "message": "No path found"})
+    return json.dumps({"success": True, "result": path})
+
+@app.route("/swapquote/<srctoken>/<desttoken>/<amounts>")
+def swapquote(srctoken, desttoken, amounts):
+    # amounts: comma separated, in raw token units (e.g. 1e18,5e18)
+    srctoken = w3.toChecksumAddress(srctoken)
+    desttoken = w3.toChecksumAddress(desttoken)
+    try:
+        _amounts = [float(a) for a in amounts.split(",")]
+    except ValueError:
+        return json.dumps({"success": False, "message": "Invalid amounts"})
+    if (len(_amounts) > SWAPQUOTE_MAX_AMOUNTS) or not all((math.isfinite(a) and (a > 0)) for a in _amounts): # float() accepts nan, inf and negatives
+        return json.dumps({"success": False, "message": "Invalid amounts"})
+    quotes = explorer.puller.defi.raptorswap.quote(srctoken, desttoken, _amounts)
+    return json.dumps({"success": True, "result": [{"amountIn": a, "routes": q} for (a, q) in zip(_amounts, quotes)]})
 
 
 @app.route("/zealyapi/hasrptr", methods=["POST"])
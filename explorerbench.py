@@ -0,0 +1,131 @@
+"""
+    End-to-end benchmark of the explorer against a local stub node (stubnode.py), no network needed.
+
+    Renders every Flask route through the test client, first with cold caches then for `--rounds` warm rounds,
+    and reports time to first byte (cold), p50/p99 latency and upstream calls (node REST paths, JSON-RPC methods, price API) per page.
+
+    python explorerbench.py
+    python explorerbench.py --latency 20 --rounds 20
+    python explorerbench.py --fixtures fixtures.json     # fixtures saved with `stubnode.py --record`
+    python explorerbench.py --trace                      # also prints which functions made the cold upstream calls
+    python explorerbench.py --index                      # pages read final blocks and transactions from a local index
+"""
+import argparse, contextlib, io, json, os, sys, tempfile, time
+import numpy as np
+import stubnode
+
+def benchRoutes(fx):
+    # (flask rule, method, path, body), parameters picked from the fixtures
+    _account = max([a for a in fx["accounts"] if a != stubnode.BURN], key=lambda a: len(fx["accounts"][a]["transactions"]))
+    _height = str(len(fx["blocks"]) // 2)
+    return [
+        ("/", "GET", "/", None),
+        ("/block/<bkid>", "GET", f"/block/{_height}", None),
+        ("/block/<bkid>", "GET", f"/block/{fx['blocks'][_height]['miningData']['proof']}", None),
+        ("/tx/<txid>", "GET", f"/tx/{fx['txOrder'][-3]}", None),
+        ("/address/<addr>", "GET", f"/address/{_account}", None),
+        ("/address/<addr>", "GET", f"/address/{stubnode.BURN}", None),
+        ("/address/<addr>", "GET", f"/address/{stubnode.BURN}?limit=50&cursor={fx['accounts'][stubnode.BURN]['transactions'][-26]}", None), # second page
+        ("/token/<addr>", "GET", f"/token/{stubnode.DUCO}", None),
+        ("/defi", "GET", "/defi", None),
+        ("/swappath/<srctoken>/<desttoken>", "GET", f"/swappath/{stubnode.WRPTR}/{stubnode.DUCO}", None),
+        ("/swapquote/<srctoken>/<desttoken>/<amounts>", "GET", f"/swapquote/{stubnode.WRPTR}/{stubnode.DUCO}/1e18,1e21", None),
+        ("/RPTRPrice", "GET", "/RPTRPrice", None),
+        ("/totalSupply", "GET", "/totalSupply", None),
+        ("/metrics", "GET", "/metrics", None),
+        ("/debug/traces", "GET", "/debug/traces", None), # 404 without --trace
+        ("/zealyapi/hasrptr", "POST", "/zealyapi/hasrptr", json.dumps({"accounts": {"wallet": _account}})),
+        ("/pageScripts.js", "GET", "/pageScripts.js", None),
+        ("/searchScripts.js", "GET", "/searchScripts.js", None),
+        ("/initScripts.js", "GET", "/initScripts.js", None),
+        ("/homePageScripts.js", "GET", "/homePageScripts.js", None),
+        ("/style.css", "GET", "/style.css", None),
+    ]
+
+def timedRequest(client, node, method, path, body):
+    node.resetCalls()
+    _start = time.perf_counter()
+    _resp = client.open(path, method=method, data=body)
+    _chunks = iter(_resp.response) # streamed pages are rendered while being read
+    _first = next(_chunks, b"")
+    _ttfb = time.perf_counter() - _start
+    _size = len(_first) + sum(len(c) for c in _chunks)
+    _resp.close()
+    return (time.perf_counter() - _start, _ttfb, _resp.status_code, _size, node.resetCalls())
+
+def formatCallers(trace):
+    # upstream calls grouped by calling functions, most frequent first
+    _counts = {}
+    for (_upstream, _call, _, _callers) in trace.calls:
+        _counts[(_upstream, _call, _callers)] = _counts.get((_upstream, _call, _callers), 0) + 1
+    return [f"{n:>5} x {upstream} {call}  <- {callers or '?'}" for ((upstream, call, callers), n) in sorted(_counts.items(), key=lambda i: -i[1])]
+
+def formatCalls(calls, rounds=1):
+    return ", ".join(f"{k}={v/rounds:g}" for (k, v) in sorted(calls.items())) or "-"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end explorer benchmark against a stub node")
+    parser.add_argument("--fixtures", help="fixtures file (JSON), generated if not given")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--blocks", type=int, default=200)
+    parser.add_argument("--port", type=int, default=4242)
+    parser.add_argument("--latency", type=float, default=0.0, help="injected latency per upstream call, in ms")
+    parser.add_argument("--rounds", type=int, default=10, help="warm rounds per page")
+    parser.add_argument("--json", help="writes results to this file")
+    parser.add_argument("--index", action="store_true", help="indexes final blocks (in a temporary file) before benchmarking")
+    parser.add_argument("--trace", action="store_true", help="enables upstream tracing, prints callers of cold upstream calls per page")
+    args = parser.parse_args()
+
+    fx = json.load(open(args.fixtures)) if args.fixtures else stubnode.buildFixtures(args.seed, args.blocks)
+    node = stubnode.StubNode(fx, args.latency / 1000).start(port=args.port)
+    _url = f"http://127.0.0.1:{args.port}"
+    os.environ["EXPLORER_NODE"] = f"{_url}/"
+    os.environ["EXPLORER_PRICE_API"] = f"{_url}/api/1/market/data?asset=Raptor%20Finance"
+    os.environ["EXPLORER_BSC_RPC"] = f"{_url}/web3"
+    _indexDir = tempfile.TemporaryDirectory() if args.index else None
+    os.environ["EXPLORER_INDEX"] = os.path.join(_indexDir.name, "index.sqlite3") if args.index else ""
+    if args.trace:
+        os.environ["EXPLORER_TRACE"] = "1"
+
+    _start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import explorer
+    print(f"startup: {time.perf_counter() - _start:.2f}s, upstream calls: {formatCalls(node.resetCalls())}")
+    # DeFi background refreshes would be counted against whatever page is being rendered
+    explorer.SYNC_POLL_DELAY = explorer.DEFI_REFRESH_DELAY = 10**6
+    if args.index:
+        # what `python indexer.py` does at each poll, in this process
+        _start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            explorer.indexer.ChainFollower(explorer.explorer.puller, explorer.indexer.ChainIndex(), explorer.REORG_DEPTH).catchUp()
+        print(f"indexed {explorer.explorer.puller.index.height() + 1} blocks in {time.perf_counter() - _start:.2f}s, upstream calls: {formatCalls(node.resetCalls())}")
+    client = explorer.app.test_client()
+
+    routes = benchRoutes(fx)
+    _missing = set(r.rule for r in explorer.app.url_map.iter_rules() if r.endpoint != "static") - set(r[0] for r in routes)
+    if _missing:
+        print(f"not benchmarked: {', '.join(sorted(_missing))}")
+
+    results = []
+    print(f"\n{'page':<58}{'status':>7}{'bytes':>9}{'cold ms':>9}{'ttfb ms':>9}{'p50 ms':>8}{'p99 ms':>8}  upstream calls (cold | warm, per request)")
+    for (_rule, _method, _path, _body) in routes:
+        (_cold, _coldTtfb, _status, _size, _coldCalls) = timedRequest(client, node, _method, _path, _body)
+        _coldTrace = explorer.tracing.RECENT[-1] if args.trace else None
+        _times = []
+        _warmCalls = {}
+        for _ in range(args.rounds):
+            (_t, _, _, _, _calls) = timedRequest(client, node, _method, _path, _body)
+            _times.append(_t)
+            for (k, v) in _calls.items():
+                _warmCalls[k] = _warmCalls.get(k, 0) + v
+        (_p50, _p99) = (np.percentile(_times, 50), np.percentile(_times, 99)) if _times else (0, 0)
+        results.append({"page": _path, "rule": _rule, "status": _status, "bytes": _size, "cold": _cold, "coldTtfb": _coldTtfb, "p50": _p50, "p99": _p99, "coldCalls": _coldCalls, "warmCalls": {k: v / max(args.rounds, 1) for (k, v) in _warmCalls.items()}})
+        print(f"{_path[:57]:<58}{_status:>7}{_size:>9}{_cold*1000:>9.1f}{_coldTtfb*1000:>9.1f}{_p50*1000:>8.1f}{_p99*1000:>8.1f}  {formatCalls(_coldCalls)} | {formatCalls(_warmCalls, max(args.rounds, 1))}")
+        if _coldTrace:
+            print("\n".join(f"{'':<10}{_line}" for _line in formatCallers(_coldTrace)))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1, default=float)
+    node.stop()
+    sys.exit(0)
@@ -1,3 +1,6 @@
+import threading
+import numpy as np
+
 class ErrProfondeur(Exception):
     pass
 
@@ -5,6 +8,8 @@ class ErrTeleportation(Exception):
     pass
 
 class Arc(object):
+    __slots__ = ("src", "dest", "cout")
+
     def __init__(self, src, dest, cout):
         self.src = src
         self.dest = dest
@@ -126,21 +131,41 @@ class NullRoute(Route):
         self.noeuds=[depart] if depart else []
         self.lCouts = []
 
+def retireCycles(depart, arcs):
+    # les couts negatifs (log-prix) peuvent faire passer une marche dans un cycle: on le coupe
+    pile = []
+    for arc in arcs:
+        for i in range(len(pile)):
+            if pile[i][0] == arc[1]:
+                del pile[i:]
+                break
+        else:
+            if arc[1] != depart:
+                pile.append(arc)
+                continue
+            pile = [] # retour au depart
+    return pile
+
 class Sommet(object):
+    __slots__ = ("arcs", "name", "dests", "destsVus", "couts")
+
     def __init__(self, name, *, _dests=None):
         self.arcs = []
         self.name = name
         self.dests = _dests if _dests else []
+        self.destsVus = set(self.dests) # evite de parcourir dests a chaque ajout
         
         self.couts = []
     
     def ajouteDest(self, dest):
         if dest[0] != self:
-            return # on pardonne pour ca
-        if dest[1] in self.dests:
-            return
+            return False # on pardonne pour ca
+        if dest[1] in self.destsVus:
+            return False
         self.dests.append(dest[1])
+        self.destsVus.add(dest[1])
         self.arcs.append(dest)
+        return True
         
     def accessiblesEn(self, hops):
         # sponsorise par le lobby des patissiers fabricants de mille-feuilles
@@ -214,17 +239,273 @@ class Sommet(object):
         cheminsValides = self.tousLesChemins(destination, maxK)
         return min(cheminsValides, key=lambda c: c.cout) if len(cheminsValides) else None
 
+    def couchesBellmanFord(self, maxK):
+        # couches[k][sommet] = (cout, arc): meilleure marche d'exactement k arcs depuis self, et son dernier arc
+        couches = [{self: (0, None)}]
+        for k in range(maxK):
+            nCouche = {}
+            for noeud, (cout, _) in couches[-1].items():
+                for arc in noeud.arcs:
+                    if arc[0] == arc[1]:
+                        continue
+                    nCout = cout + arc[2]
+                    if (arc[1] not in nCouche) or (nCout < nCouche[arc[1]][0]):
+                        nCouche[arc[1]] = (nCout, arc)
+            if not len(nCouche):
+                break
+            couches.append(nCouche)
+        return couches
+
+    def routeDepuisCouches(self, couches, destination, k):
+        # remonte les arcs depuis la couche k
+        arcs = []
+        noeud = destination
+        for i in range(k, 0, -1):
+            arc = couches[i][noeud][1]
+            arcs.append(arc)
+            noeud = arc[0]
+        arcs.reverse()
+
+        route = NullRoute(self)
+        for arc in retireCycles(self, arcs):
+            route.append(arc)
+        return route
+
+    def cheminMoinsCherBorne(self, destination, maxK):
+        """
+            Renvoie le chemin le moins cher d'au plus maxK arcs (Bellman-Ford borne, O(maxK * arcs)).
+            Marche avec des couts negatifs: les cycles (negatifs) sont bornes par maxK puis retires du chemin.
+        """
+        couches = self.couchesBellmanFord(maxK)
+        meilleure = None
+        for k in range(1, len(couches)):
+            cible = next((n for n in couches[k] if n.name == destination), None)
+            if cible is None:
+                continue
+            route = self.routeDepuisCouches(couches, cible, k)
+            if len(route.lCouts) and ((meilleure is None) or (route.cout < meilleure.cout)):
+                meilleure = route
+        return meilleure
+
     def __repr__(self):
         return self.name
 
+class EtatCSR(object):
+    """
+        Version publiee d'un GrapheCSR: jamais modifiee apres publication, une mise a jour des couts en publie une nouvelle.
+        Un lecteur qui a lu graphe.etat route sur une version coherente, sans verrou.
+    """
+    __slots__ = ("sommets", "ids", "arcs", "indicesArcs", "indptr", "srcs", "indices", "couts", "ordre", "position")
+
+    def __init__(self, sommets=(), ids=None, arcs=(), indicesArcs=None, indptr=None, srcs=None, indices=None, couts=None, ordre=None, position=None):
+        self.sommets = sommets                  # numero -> Sommet
+        self.ids = ids or {}                    # nom -> numero du sommet
+        self.arcs = arcs                        # arcs, dans l'ordre d'ajout
+        self.indicesArcs = indicesArcs or {}    # arc -> indice dans arcs
+        vide = np.zeros(0, dtype=np.int64)
+        self.indptr = np.zeros(1, dtype=np.int64) if indptr is None else indptr    # arcs du sommet i: emplacements indptr[i] a indptr[i+1]
+        self.srcs = vide if srcs is None else srcs                                  # emplacement -> sommet de depart
+        self.indices = vide if indices is None else indices                         # emplacement -> sommet d'arrivee
+        self.couts = np.zeros(0, dtype=np.float64) if couts is None else couts      # emplacement -> cout
+        self.ordre = vide if ordre is None else ordre                               # emplacement -> indice de l'arc
+        self.position = vide if position is None else position                      # indice de l'arc -> emplacement
+
+    def avecCouts(self, couts):
+        return EtatCSR(self.sommets, self.ids, self.arcs, self.indicesArcs, self.indptr, self.srcs, self.indices, couts, self.ordre, self.position)
+
+    def coutArc(self, arc):
+        return self.couts[self.position[self.indicesArcs[arc]]]
+
+class GrapheCSR(object):
+    """
+        Graphe compact: sommets numerotes, adjacence en tableaux CSR (numpy), un tableau de couts par version.
+        Les arcs restent des objets (ArcPaire...), les tableaux n'en gardent que les indices.
+        Les ecritures (ajouts, couts) construisent de nouveaux tableaux et publient un nouvel EtatCSR d'un coup.
+    """
+    __slots__ = ("ids", "sommets", "arcs", "indicesArcs", "paires", "propre", "etat", "verrou")
+
+    def __init__(self):
+        self.ids = {}           # nom -> numero du sommet
+        self.sommets = []       # numero -> Sommet
+        self.arcs = []          # arcs, dans l'ordre d'ajout
+        self.indicesArcs = {}   # arc -> indice dans self.arcs
+        self.paires = set()     # (src, dest) deja presents
+        self.propre = True      # etat publie a jour?
+        self.etat = EtatCSR()   # derniere version publiee
+        self.verrou = threading.Lock() # un seul ecrivain a la fois
+
+    def ajouteSommet(self, sommet):
+        if sommet.name not in self.ids:
+            self.ids[sommet.name] = len(self.sommets)
+            self.sommets.append(sommet)
+            self.propre = False
+        return self.ids[sommet.name]
+
+    def ajouteArc(self, arc):
+        cle = (self.ajouteSommet(arc[0]), self.ajouteSommet(arc[1]))
+        if cle in self.paires:
+            return False
+        self.paires.add(cle)
+        self.indicesArcs[arc] = len(self.arcs)
+        self.arcs.append(arc)
+        self.propre = False
+        return True
+
+    def compile(self):
+        with self.verrou:
+            srcs = np.array([self.ids[a[0].name] for a in self.arcs], dtype=np.int64)
+            dests = np.array([self.ids[a[1].name] for a in self.arcs], dtype=np.int64)
+            ordre = np.argsort(srcs, kind="stable")
+            position = np.empty_like(ordre)
+            position[ordre] = np.arange(len(ordre))
+            indptr = np.concatenate(([0], np.cumsum(np.bincount(srcs, minlength=len(self.sommets))))).astype(np.int64)
+            arcs = tuple(self.arcs)
+            couts = np.array([arcs[i][2] for i in ordre], dtype=np.float64)
+            self.propre = True
+            self.etat = EtatCSR(tuple(self.sommets), dict(self.ids), arcs, dict(self.indicesArcs), indptr, srcs[ordre], dests[ordre], couts, ordre, position)
+            return self.etat
+
+    def etatCourant(self):
+        return self.etat if self.propre else self.compile()
+
+    def majCouts(self, arcs=None):
+        # recopie le cout des arcs (tous, ou seulement ceux donnes) dans un nouveau tableau, publie avec la nouvelle version
+        if not self.propre:
+            return self.compile()
+        with self.verrou:
+            etat = self.etat
+            if arcs is None:
+                couts = np.array([etat.arcs[i][2] for i in etat.ordre], dtype=np.float64)
+            else:
+                couts = etat.couts.copy()
+                for arc in arcs:
+                    if arc in etat.indicesArcs: # arcs en double ne sont pas dans le graphe
+                        couts[etat.position[etat.indicesArcs[arc]]] = arc[2]
+            self.etat = etat.avecCouts(couts)
+            return self.etat
+
+    def voisins(self, nom, etat=None):
+        etat = etat or self.etatCourant()
+        i = etat.ids[nom]
+        return [etat.sommets[j] for j in etat.indices[etat.indptr[i]:etat.indptr[i+1]]]
+
+    def bellmanFord(self, etat, src, maxK):
+        """
+            Bellman-Ford borne et vectorise: dist[k, v] = cout de la meilleure marche d'exactement k arcs vers v,
+            parents[k, v] = emplacement de son dernier arc (pointeurs vers la couche k-1, pas de copie de chemins).
+        """
+        dist = np.full((maxK+1, len(etat.sommets)), np.inf)
+        parents = np.full((maxK+1, len(etat.sommets)), -1, dtype=np.int64)
+        dist[0, src] = 0
+        valides = (etat.srcs != etat.indices) # pas de boucles
+        derniere = 0
+        for k in range(1, maxK+1):
+            candidats = dist[k-1, etat.srcs] + etat.couts
+            emplacements = np.flatnonzero(valides & np.isfinite(candidats))
+            if not len(emplacements):
+                break
+            np.minimum.at(dist[k], etat.indices[emplacements], candidats[emplacements])
+            gagnants = emplacements[candidats[emplacements] == dist[k, etat.indices[emplacements]]]
+            parents[k, etat.indices[gagnants]] = gagnants
+            derniere = k
+        return dist[:derniere+1], parents[:derniere+1]
+
+    def sourcesTouchees(self, etat, arcs, maxK):
+        """
+            Sommets dont une marche d'au plus maxK arcs peut emprunter un des arcs donnes, en booleens par sommet:
+            ceux qui atteignent le depart d'un de ces arcs en au plus maxK-1 arcs (parcours en largeur a rebours).
+        """
+        touches = np.zeros(len(etat.sommets), dtype=bool)
+        touches[[etat.ids[arc[0].name] for arc in arcs if arc in etat.indicesArcs]] = True
+        frontiere = touches.copy()
+        for _ in range(maxK-1):
+            precedents = np.zeros_like(touches)
+            precedents[etat.srcs[frontiere[etat.indices]]] = True
+            frontiere = precedents & ~touches
+            if not frontiere.any():
+                break
+            touches |= frontiere
+        return touches
+
+    def chemin(self, src, dest, maxK, etat=None):
+        # route la moins chere d'au plus maxK arcs (None si dest est inaccessible)
+        etat = etat or self.etatCourant()
+        (s, d) = (etat.ids.get(src), etat.ids.get(dest))
+        if (s is None) or (d is None):
+            return None
+        dist, parents = self.bellmanFord(etat, s, maxK)
+        return self.meilleurChemin(etat, s, d, dist, parents)
+
+    def cheminsDepuis(self, src, maxK, etat=None):
+        # routes les moins cheres de src vers tous les sommets accessibles, un seul Bellman-Ford: {nom: route}
+        return self.ligneTable(src, maxK, etat)[0]
+
+    def ligneTable(self, src, maxK, etat=None, precedente=None):
+        """
+            Routes les moins cheres de src, un seul Bellman-Ford: ({nom: route}, cout de la meilleure marche par sommet).
+            Avec la ligne precedente (memes sommets, autres couts), seules les routes dont le cout a change sont reconstruites.
+        """
+        etat = etat or self.etatCourant()
+        s = etat.ids.get(src)
+        if s is None:
+            return {}, np.full(len(etat.sommets), np.inf)
+        dist, parents = self.bellmanFord(etat, s, maxK)
+        couts = dist[1:].min(axis=0) if (len(dist) > 1) else np.full(len(etat.sommets), np.inf)
+        couts[s] = np.inf # pas de route vers soi-meme
+        if precedente and (len(precedente[1]) == len(couts)):
+            chemins = dict(precedente[0])
+            aRefaire = np.flatnonzero(couts != precedente[1])
+        else:
+            chemins = {}
+            aRefaire = np.flatnonzero(np.isfinite(couts))
+        for d in aRefaire:
+            route = self.meilleurChemin(etat, s, d, dist, parents)
+            if route:
+                chemins[etat.sommets[d].name] = route
+            else:
+                chemins.pop(etat.sommets[d].name, None)
+        return chemins, couts
+
+    def meilleurChemin(self, etat, s, d, dist, parents):
+        # une seule reconstruction: la marche de la couche ou d est le moins cher, sans ses cycles
+        if len(dist) < 2:
+            return None
+        k = int(np.argmin(dist[1:, d])) + 1
+        if not np.isfinite(dist[k, d]):
+            return None
+        arcs = retireCycles(etat.sommets[s], [etat.arcs[etat.ordre[e]] for e in self.marche(etat, parents, k, d)])
+        return self.route(etat, s, arcs) if len(arcs) else None
+
+    def marche(self, etat, parents, k, noeud):
+        # emplacements des arcs de la meilleure marche d'exactement k arcs vers noeud, dans l'ordre
+        emplacements = []
+        for i in range(k, 0, -1):
+            emplacements.append(parents[i, noeud])
+            noeud = etat.srcs[parents[i, noeud]]
+        return emplacements[::-1]
+
+    def route(self, etat, s, arcs):
+        # couts de la version, pas ceux (peut etre deja modifies) des objets arcs
+        route = NullRoute(etat.sommets[s])
+        for arc in arcs:
+            route.append(arc)
+        route.lCouts = [etat.coutArc(a) for a in arcs]
+        route.cout = sum(route.lCouts)
+        return route
+
 graph = {}
+csr = GrapheCSR()
+
+SAUTSMAX = None # nombre max d'arcs d'un chemin (None: nombre de sommets)
 
 def creeSommet(nom, classeCustom=Sommet):
     if not graph.get(nom):
         graph[nom] = classeCustom(nom)
+        csr.ajouteSommet(graph[nom])
 
 def ajouteArc(arc):
-    arc[0].ajouteDest(arc)
+    if arc[0].ajouteDest(arc):
+        csr.ajouteArc(arc)
 
 sommets = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i']
 
@@ -262,7 +543,11 @@ def plusCourtChemin(a, b):
     return graph[a].cheminPlusCourt(b, len(graph.keys()))
 
 def cheminLeMoinsCher(a, b):
-    return graph[a].cheminMoinsCher(b, len(graph.keys()))
+    return csr.chemin(a, b, SAUTSMAX or len(graph.keys()))
+
+def cheminsLesMoinsChers(a):
+    # {b: route la moins chere de a vers b} pour tous les b accessibles
+    return csr.cheminsDepuis(a, SAUTSMAX or len(graph.keys()))
 
 if __name__ == "__main__":
     setupSommets(sommets)
@@ -270,8 +555,10 @@ if __name__ == "__main__":
 
     c = graph["a"].cheminPlusCourt("e", len(graph.keys()))
     g = graph["a"].cheminMoinsCher("e", len(graph.keys()))
+    bf = cheminLeMoinsCher("a", "e")
     print("Chemin le plus court de a vers e (sans tenir compte du cout):", c.noeuds, 'longueur:',  len(c.noeuds), 'cout:', c.cout)
     print("Chemin le moins cher de a vers e (en ignorant la longueur):", g.noeuds, 'longueur:', len(g.noeuds), 'cout:', g.cout)
+    print("Chemin le moins cher de a vers e (Bellman-Ford borne):", bf.noeuds, 'longueur:', len(bf.noeuds), 'cout:', bf.cout)
 
     print("")
 
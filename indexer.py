@@ -0,0 +1,175 @@
+import json, os, sqlite3, threading, time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# local chain index, opt-in: EXPLORER_INDEX=index.sqlite3
+# a single dedicated process writes it (`python indexer.py`), explorer workers only read it
+INDEX_FILE = os.environ.get("EXPLORER_INDEX", "")
+INDEX_POLL_DELAY = 5 # seconds between two checks for new final blocks
+INDEX_BATCH_BLOCKS = 100 # blocks fetched (and committed) at once while catching up
+INDEX_WORKERS = 4 # concurrent node calls of the indexer
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS blocks (height INTEGER PRIMARY KEY, hash TEXT NOT NULL, raw TEXT NOT NULL);
+    CREATE UNIQUE INDEX IF NOT EXISTS blocksByHash ON blocks (hash);
+    CREATE TABLE IF NOT EXISTS transactions (txid TEXT PRIMARY KEY, height INTEGER NOT NULL, position INTEGER NOT NULL, txtype INTEGER, sender TEXT, recipient TEXT, value TEXT, raw TEXT);
+    CREATE INDEX IF NOT EXISTS transactionsByHeight ON transactions (height, position);
+    CREATE TABLE IF NOT EXISTS account_txs (address TEXT NOT NULL, height INTEGER NOT NULL, position INTEGER NOT NULL, txid TEXT NOT NULL, PRIMARY KEY (address, height, position));
+"""
+
+# what transaction lists need, read without decoding the transaction again
+IndexedTransaction = namedtuple("IndexedTransaction", ["txid", "height", "position", "txtype", "sender", "recipient", "value"])
+
+class ChainIndex(object):
+    """
+        SQLite store of final blocks, their decoded transactions and the accounts they affect,
+        indexed by height, block hash, txid and address. Only written by ChainFollower.
+    """
+    def __init__(self, path=INDEX_FILE):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30) # writes only
+        self.lock = threading.Lock()
+        self.readers = threading.local() # a read connection per thread
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL") # readers don't wait for the follower's commits
+            self.db.executescript(SCHEMA)
+
+    def reader(self):
+        if not hasattr(self.readers, "db"):
+            self.readers.db = sqlite3.connect(self.path, timeout=30)
+            self.readers.db.execute("PRAGMA query_only=ON")
+        return self.readers.db
+
+    def query(self, sql, params=()):
+        return self.reader().execute(sql, params).fetchall()
+
+    def height(self):
+        # highest indexed block, -1 when empty (blocks are indexed in order)
+        return self.query("SELECT COALESCE(MAX(height), -1) FROM blocks")[0][0]
+
+    def blockHash(self, height):
+        _rows = self.query("SELECT hash FROM blocks WHERE height = ?", (height,))
+        return _rows[0][0] if _rows else None
+
+    def block(self, blockid):
+        # raw block (as served by the node), by height or hash
+        if (type(blockid) == int) or blockid.isnumeric():
+            _rows = self.query("SELECT raw FROM blocks WHERE height = ?", (int(blockid),))
+        else:
+            _rows = self.query("SELECT raw FROM blocks WHERE hash = ?", (blockid.lower(),))
+        return json.loads(_rows[0][0]) if _rows else None
+
+    def transaction(self, txid):
+        # raw transaction (as served by `/get/transactions/`), None if unknown or not served by the node (deposits)
+        _rows = self.query("SELECT raw FROM transactions WHERE txid = ?", (txid.lower(),))
+        return json.loads(_rows[0][0]) if (_rows and _rows[0][0]) else None
+
+    def transactions(self, txids):
+        # {txid: IndexedTransaction} for those that are indexed
+        _found = {}
+        _lowered = {h.lower(): h for h in txids}
+        _keys = list(_lowered)
+        for i in range(0, len(_keys), 500): # stays below SQLite's limit of bound parameters
+            _chunk = _keys[i:i+500]
+            for _row in self.query(f"SELECT txid, height, position, txtype, sender, recipient, value FROM transactions WHERE txid IN ({','.join('?' * len(_chunk))})", _chunk):
+                _found[_lowered[_row[0]]] = IndexedTransaction(*_row[:6], int(_row[6]))
+        return _found
+
+    def position(self, txid):
+        # (height, position in its block) of an indexed transaction, None if unknown
+        _rows = self.query("SELECT height, position FROM transactions WHERE txid = ?", (txid.lower(),))
+        return tuple(_rows[0]) if _rows else None
+
+    def accountTransactions(self, address, limit, before=None):
+        # txids affecting `address`, newest first: the `limit` ones older than `before` (height, position), or the newest ones
+        if before is None:
+            _rows = self.query("SELECT txid FROM account_txs WHERE address = ? ORDER BY height DESC, position DESC LIMIT ?", (address.lower(), limit))
+        else:
+            _rows = self.query("SELECT txid FROM account_txs WHERE address = ? AND (height, position) < (?, ?) ORDER BY height DESC, position DESC LIMIT ?", (address.lower(), *before, limit))
+        return [r[0] for r in _rows]
+
+    def accountPosition(self, address, txid):
+        # (height, position) of an indexed transaction affecting `address`, None otherwise
+        _rows = self.query("SELECT a.height, a.position FROM transactions t JOIN account_txs a ON a.address = ? AND a.height = t.height AND a.position = t.position WHERE t.txid = ?", (address.lower(), txid.lower()))
+        return tuple(_rows[0]) if _rows else None
+
+    def addBlocks(self, blocks):
+        # [(raw block, [(position, transaction)])], written in a single SQLite transaction
+        with self.lock, self.db:
+            for (_raw, _txs) in blocks:
+                _height = _raw.get("height", 0)
+                self.db.execute("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?)", (_height, _raw["miningData"]["proof"].lower(), json.dumps(_raw)))
+                for (_position, _tx) in _txs:
+                    _txRaw = getattr(_tx, "raw", None)
+                    self.db.execute("INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (_tx.txid.lower(), _height, _position, _tx.txtype, _tx.sender, _tx.recipient, str(_tx.value), (json.dumps(_txRaw) if _txRaw else None)))
+                    _accounts = set(a.lower() for a in (list(getattr(_tx, "affectedAccounts", ())) + [_tx.sender, _tx.recipient]) if a) - {ZERO_ADDRESS}
+                    self.db.executemany("INSERT OR REPLACE INTO account_txs VALUES (?, ?, ?, ?)", [(a, _height, _position, _tx.txid.lower()) for a in _accounts])
+
+    def rollback(self, height):
+        # forgets blocks from `height`, they get indexed again
+        with self.lock, self.db:
+            for _table in ("blocks", "transactions", "account_txs"):
+                self.db.execute(f"DELETE FROM {_table} WHERE height >= ?", (height,))
+
+class ChainFollower(object):
+    """
+        Indexes final blocks (older than `reorgDepth`), fetched and decoded with the puller's node calls but on its own pool
+        and without going through its cache: catching up doesn't delay page renders or evict what they cached.
+    """
+    def __init__(self, puller, index, reorgDepth):
+        self.puller = puller
+        self.index = index
+        self.reorgDepth = reorgDepth
+        self.pool = ThreadPoolExecutor(max_workers=INDEX_WORKERS, thread_name_prefix="indexer")
+
+    def loadBlock(self, height):
+        return self.puller.Block(self.puller.nodeGet(f"/chain/block/{height}", {}))
+
+    def loadTransactions(self, txids):
+        # decoded transactions by lowered txid, cross-chain deposits fetched separately (like loadBatchOfTransactions)
+        _txs = {}
+        for _chunkRaws in self.pool.map(self.puller.loadChunkOfTransactions, self.puller.txidChunks(txids)):
+            for _raw in _chunkRaws:
+                _txs[_raw["hash"].lower()] = self.puller.Transaction(_raw)
+        _missing = [h for h in txids if not h.lower() in _txs]
+        for h, _deposit in zip(_missing, self.pool.map(self.puller.loadDeposit, _missing)):
+            if _deposit:
+                _txs[h.lower()] = _deposit
+        return _txs
+
+    def catchUp(self):
+        _final = self.puller.loadStats().chainLength - 1 - self.reorgDepth
+        while self.index.height() < _final:
+            _start = self.index.height() + 1
+            _heights = list(range(_start, min(_final, _start + INDEX_BATCH_BLOCKS - 1) + 1))
+            _blocks = list(self.pool.map(self.loadBlock, _heights))
+            if not all(b.raw for b in _blocks):
+                return # not served by the node (yet), retried at next poll
+            if _blocks[0].height and (_blocks[0].parent.lower() != self.index.blockHash(_start - 1)):
+                # a block we indexed as final got reorganized after all, goes back a bit further
+                print(f"Index: block {_start} doesn't follow indexed block {_start - 1}, rolling back")
+                self.index.rollback(max(_start - self.reorgDepth, 0))
+                continue
+            _txs = self.loadTransactions([h for b in _blocks for h in b.transactions])
+            _unknown = [h for b in _blocks for h in b.transactions if not h.lower() in _txs]
+            if _unknown:
+                print(f"Index: {len(_unknown)} transactions of blocks {_start}-{_heights[-1]} not served by the node (first {_unknown[0]}), retrying")
+                return # retried at next poll rather than indexed without them
+            self.index.addBlocks([(b.raw, [(p, _txs[h.lower()]) for (p, h) in enumerate(b.transactions)]) for b in _blocks])
+
+    def run(self):
+        while True:
+            try:
+                self.catchUp()
+            except Exception as e:
+                print(f"Indexing failed: {e.__repr__()}") # retried at next poll
+            time.sleep(INDEX_POLL_DELAY)
+
+if __name__ == "__main__":
+    # the index writer, one per index file: EXPLORER_INDEX=index.sqlite3 python indexer.py
+    import explorer
+    if not INDEX_FILE:
+        raise SystemExit("EXPLORER_INDEX isn't set")
+    ChainFollower(explorer.explorer.puller, ChainIndex(INDEX_FILE), explorer.REORG_DEPTH).run()
@@ -0,0 +1,68 @@
+import json, os, threading
+
+METADATA_FILE = "metadata.json" # token and pair metadata, kept across restarts
+METADATA_SAVE_DELAY = 2 # seconds new entries are gathered before the store is written (once for all of them)
+
+class MetadataStore(object):
+    """
+        On-disk store of immutable contract metadata (token name/symbol/decimals, pair token0/token1).
+        Loaded at startup, only addresses it hasn't seen yet are fetched from the chain.
+    """
+    def __init__(self, path=METADATA_FILE):
+        self.path = path
+        self.tokens = {}
+        self.pairs = {}
+        self.lock = threading.Lock()
+        self.saveLock = threading.Lock() # one writer of the file at a time
+        self.pending = None # timer of the next save, while new entries wait to be written
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                _stored = json.load(f)
+            self.tokens = _stored.get("tokens", {})
+            self.pairs = _stored.get("pairs", {})
+        except (OSError, ValueError):
+            pass # no store yet (or unreadable), everything gets fetched again
+
+    def changed(self):
+        # a cold start sees many new addresses at once: the file is written once they're in, not for each of them
+        with self.lock:
+            if self.pending:
+                return
+            self.pending = threading.Timer(METADATA_SAVE_DELAY, self.save)
+            self.pending.daemon = True
+            self.pending.start()
+
+    def save(self):
+        # written to a temporary file first, so that a crash never leaves a truncated store behind
+        _tmp = f"{self.path}.{os.getpid()}.tmp"
+        with self.saveLock:
+            with self.lock:
+                self.pending = None # entries added from now on get their own save
+                _data = json.dumps({"tokens": self.tokens, "pairs": self.pairs})
+            try:
+                with open(_tmp, "w") as f:
+                    f.write(_data)
+                os.replace(_tmp, self.path)
+            except OSError:
+                pass # read-only filesystem, store stays in memory
+
+    def token(self, contract):
+        _meta = self.tokens.get(contract.address)
+        if not _meta:
+            _meta = {"name": contract.functions.name().call(), "symbol": contract.functions.symbol().call(), "decimals": contract.functions.decimals().call()}
+            with self.lock:
+                self.tokens[contract.address] = _meta
+            self.changed()
+        return _meta
+
+    def pair(self, contract):
+        _meta = self.pairs.get(contract.address)
+        if not _meta:
+            _meta = {"token0": contract.functions.token0().call(), "token1": contract.functions.token1().call()}
+            with self.lock:
+                self.pairs[contract.address] = _meta
+            self.changed()
+        return _meta
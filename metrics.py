@@ -0,0 +1,173 @@
+import threading, time
+from bisect import bisect_left
+import tracing
+
+# Prometheus text exposition format, without the client library
+# counters and histograms are per process (each worker exposes its own)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30) # seconds
+
+def formatLabels(names, values):
+    if not names:
+        return ""
+    _escaped = [str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for v in values]
+    return "{" + ",".join(f"{n}=\"{v}\"" for (n, v) in zip(names, _escaped)) + "}"
+
+class Counter(object):
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = {} # label values -> count
+        self.lock = threading.Lock()
+
+    def inc(self, *labelValues, amount=1):
+        with self.lock:
+            self.values[labelValues] = self.values.get(labelValues, 0) + amount
+
+    def render(self):
+        _lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            _values = sorted(self.values.items())
+        _lines += [f"{self.name}{formatLabels(self.labels, k)} {v}" for (k, v) in _values]
+        return _lines
+
+class Histogram(object):
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {} # label values -> [counts per bucket (+Inf last), sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labelValues):
+        _bucket = bisect_left(self.buckets, value)
+        with self.lock:
+            _v = self.values.get(labelValues)
+            if _v is None:
+                _v = self.values[labelValues] = [[0] * (len(self.buckets) + 1), 0.0]
+            _v[0][_bucket] += 1
+            _v[1] += value
+
+    def time(self, *labelValues):
+        return Timer(self, labelValues)
+
+    def render(self):
+        _lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            _values = sorted((k, (list(v[0]), v[1])) for (k, v) in self.values.items())
+        for (_labelValues, (_counts, _sum)) in _values:
+            _cumulative = 0
+            for (_bound, _count) in zip(self.buckets + ("+Inf",), _counts):
+                _cumulative += _count
+                _lines.append(f"{self.name}_bucket{formatLabels(self.labels + ('le',), _labelValues + (_bound,))} {_cumulative}")
+            _lines.append(f"{self.name}_sum{formatLabels(self.labels, _labelValues)} {_sum}")
+            _lines.append(f"{self.name}_count{formatLabels(self.labels, _labelValues)} {_cumulative}")
+        return _lines
+
+class Timer(object):
+    # with histogram.time(labels...): observes the duration of the block, even if it raises
+    def __init__(self, histogram, labelValues):
+        self.histogram = histogram
+        self.labelValues = labelValues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelValues)
+        return False
+
+class Gauge(object):
+    # value read when rendered: callback returns a number, or {label values: number}
+    kind = "gauge"
+
+    def __init__(self, name, description, callback, labels=()):
+        self.name = name
+        self.description = description
+        self.callback = callback
+        self.labels = tuple(labels)
+
+    def render(self):
+        _lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            _value = self.callback()
+        except Exception:
+            return _lines # not available (yet), no sample
+        _values = _value.items() if isinstance(_value, dict) else [((), _value)]
+        _lines += [f"{self.name}{formatLabels(self.labels, k)} {float(v)}" for (k, v) in _values]
+        return _lines
+
+class CallbackCounter(Gauge):
+    # monotonic count kept by someone else (e.g. the object cache), read when rendered
+    kind = "counter"
+
+class Registry(object):
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, description, labels=()):
+        return self.register(Counter(name, description, labels))
+
+    def histogram(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def gauge(self, name, description, callback, labels=()):
+        return self.register(Gauge(name, description, callback, labels))
+
+    def callbackCounter(self, name, description, callback, labels=()):
+        return self.register(CallbackCounter(name, description, callback, labels))
+
+    def render(self):
+        return "\n".join(_line for _metric in self.metrics for _line in _metric.render()) + "\n"
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.histogram("explorer_request_duration_seconds", "Time spent serving a request, by Flask route", ("route", "method", "status"))
+UPSTREAM_DURATION = REGISTRY.histogram("explorer_upstream_duration_seconds", "Duration of upstream calls, by upstream and call type (node REST path, JSON-RPC method...)", ("upstream", "call"))
+UPSTREAM_ERRORS = REGISTRY.counter("explorer_upstream_errors_total", "Upstream calls that raised", ("upstream", "call"))
+SINGLEFLIGHT_SHARED = REGISTRY.counter("explorer_singleflight_shared_total", "Fetches not made because an identical one was already in flight, by kind of object", ("kind",))
+RPC_METHODS = REGISTRY.counter("explorer_rpc_methods_total", "JSON-RPC methods sent upstream, including those inside batches (eth_call by contract method)", ("method",))
+
+SELECTOR_NAMES = {} # 4-byte selector -> contract method name, registered by the explorer
+
+def rpcLabel(method, params):
+    # eth_call labelled by the contract method it calls (eth_call:balanceOf), other methods by their name
+    if (method == "eth_call") and params and isinstance(params[0], dict):
+        _selector = str(params[0].get("data") or params[0].get("input") or "")[:10]
+        return f"eth_call:{SELECTOR_NAMES.get(_selector, _selector or 'none')}"
+    return method
+
+def batchLabel(labels):
+    # a batch is a single round trip, labelled by what it contains (batch:eth_blockNumber+eth_call:getReserves)
+    return "batch:" + "+".join(sorted(set(labels)))
+
+def timeUpstream(upstream, call):
+    return UpstreamTimer(upstream, call)
+
+class UpstreamTimer(Timer):
+    def __init__(self, upstream, call):
+        super().__init__(UPSTREAM_DURATION, (upstream, call))
+
+    def __exit__(self, excType, *exc):
+        if excType is not None:
+            UPSTREAM_ERRORS.inc(*self.labelValues)
+        tracing.record(*self.labelValues, time.perf_counter() - self.start)
+        return super().__exit__(excType, *exc)
+
+def web3Middleware(upstream):
+    # web3 middleware timing every JSON-RPC request made through a Web3 instance
+    def middleware(makeRequest, _web3):
+        def timedRequest(method, params):
+            _label = rpcLabel(method, params)
+            RPC_METHODS.inc(_label)
+            with timeUpstream(upstream, _label):
+                return makeRequest(method, params)
+        return timedRequest
+    return middleware
@@ -0,0 +1,198 @@
+"""
+    Benchmark hors ligne du pathfinder: graphes synthetiques (jetons, paires, reserves aleatoires), sans RPC.
+    Chronometre chaque moteur de routage sur les memes requetes, mesure la memoire (pic, blocs retenus)
+    et compare les couts trouves. Avec --reference, echoue si un moteur a ralenti au-dela de --tolerance.
+
+    python pathbench.py
+    python pathbench.py --tailles 20,100 --densites 3,8 --json bench.json
+    python pathbench.py --reference bench.json
+"""
+import argparse, json, random, sys, time, tracemalloc
+import numpy as np
+import graphtest as graph
+import pathfinder
+
+class PaireSynthetique(object):
+    def __init__(self, address):
+        self.address = address
+
+class ArcSynthetique(pathfinder.ArcPaire):
+    # meme interface qu'ArcPaire (reserves, sens, cout), sans contrat ni RPC
+    def __init__(self, paire, sensDirect, sommet0, sommet1, reserves):
+        self.paire = paire
+        self.sensDirect = sensDirect
+        (self.src, self.dest) = (sommet0, sommet1) if sensDirect else (sommet1, sommet0)
+        (self.tickersrc, self.tickerdest) = (self.src.name, self.dest.name)
+        self.cout = np.inf
+        self.refresh(reserves)
+
+def grapheSynthetique(nJetons, densite, rng):
+    """
+        nJetons jetons, en moyenne `densite` paires par jeton. Un arbre couvrant oriente vers les premiers jetons
+        (comme WRPTR, par qui passe la liquidite) garantit que tout est accessible, le reste est tire au hasard.
+    """
+    g = pathfinder.Graphe()
+    noms = [f"T{i}" for i in range(nJetons)]
+    paires = set()
+    for i in range(1, nJetons):
+        paires.add((min(i, int(rng.random()**2 * i)), i))
+    while len(paires) < min(nJetons * densite // 2, nJetons * (nJetons - 1) // 2):
+        (a, b) = sorted(rng.sample(range(nJetons), 2))
+        paires.add((a, b))
+
+    for nom in noms:
+        g.sommets[nom] = graph.Sommet(nom)
+        g.csr.ajouteSommet(g.sommets[nom])
+    for n, (a, b) in enumerate(sorted(paires)):
+        reserves = (int(10**rng.uniform(20, 24)), int(10**rng.uniform(20, 24)))
+        paire = PaireSynthetique(f"P{n}")
+        arcs = (ArcSynthetique(paire, True, g.sommets[noms[a]], g.sommets[noms[b]], reserves), ArcSynthetique(paire, False, g.sommets[noms[a]], g.sommets[noms[b]], reserves))
+        for arc in arcs:
+            if arc[0].ajouteDest(arc):
+                g.csr.ajouteArc(arc)
+        g.arcs += arcs
+        g.arcsParPaire[paire.address] = arcs
+    return g
+
+def moteurs(g, sauts):
+    # nom -> fonction(src, dest), renvoie une route (ou une liste de routes) pour comparer les couts
+    etat = g.csr.etatCourant()
+    return {
+        "tousLesChemins": lambda a, b: g.sommets[a].tousLesChemins(b, sauts),
+        "cheminPlusCourt": lambda a, b: g.sommets[a].cheminPlusCourt(b, sauts),
+        "cheminMoinsCher": lambda a, b: g.sommets[a].cheminMoinsCher(b, sauts),
+        "cheminMoinsCherBorne": lambda a, b: g.sommets[a].cheminMoinsCherBorne(b, sauts),
+        "csr.chemin": lambda a, b: g.csr.chemin(a, b, sauts, etat),
+        "table": lambda a, b: g.route(a, b),
+        "meilleuresCotations": lambda a, b: g.meilleuresCotations(a, b, [1e18, 1e20, 1e22], sauts),
+    }
+
+def mesure(fonction, requetes):
+    # temps par requete (s), puis une seconde passe sous tracemalloc: pic (octets) et blocs encore alloues
+    temps = []
+    for (a, b) in requetes:
+        debut = time.perf_counter()
+        fonction(a, b)
+        temps.append(time.perf_counter() - debut)
+    tracemalloc.start()
+    avant = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    resultats = [fonction(a, b) for (a, b) in requetes]
+    pic = tracemalloc.get_traced_memory()[1]
+    apres = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocs = sum(s.count_diff for s in apres.compare_to(avant, "filename") if s.count_diff > 0)
+    return {"moyenne": float(np.mean(temps)), "p99": float(np.percentile(temps, 99)), "pic": pic, "blocs": blocs}, resultats
+
+def ecarts(resultats, reference):
+    # requetes dont le cout differe de la reference (None des deux cotes: accord)
+    n = 0
+    for (r, ref) in zip(resultats, reference):
+        if (r is None) != (ref is None) or (r is not None and abs(r.cout - ref.cout) > 1e-9):
+            n += 1
+    return n
+
+def chronometre(fonction, n):
+    # n executions de fonction(), memes statistiques que mesure() (sans la memoire)
+    temps = []
+    for _ in range(n):
+        debut = time.perf_counter()
+        fonction()
+        temps.append(time.perf_counter() - debut)
+    return {"moyenne": float(np.mean(temps)), "p99": float(np.percentile(temps, 99)), "pic": 0, "blocs": 0}
+
+def verifieMajPaires(g, rng):
+    """
+        Mise a jour par logs Sync d'une paire que certains jetons ne peuvent pas emprunter (en SAUTSTABLE arcs):
+        leurs lignes doivent etre reprises telles quelles (memes objets), pas recalculees. Echoue sinon.
+        Renvoie le nombre de lignes qui different d'une construction complete de la table.
+    """
+    etat = g.version.etat
+    for addr in rng.sample(list(g.arcsParPaire), len(g.arcsParPaire)):
+        touches = g.csr.sourcesTouchees(etat, g.arcsParPaire[addr], pathfinder.SAUTSTABLE)
+        if not touches.all():
+            break
+    else:
+        return 0 # chaque jeton peut emprunter chaque paire, rien a reprendre
+    avant = g.version
+    arc = g.arcsParPaire[addr][0]
+    g.majPaires({addr: (arc.reserve0 * 2, arc.reserve1)})
+    for src, i in etat.ids.items():
+        if not touches[i]:
+            assert g.version.table[src] is avant.table[src], f"{src}: ligne recalculee alors que {addr} lui est inaccessible"
+    complete = g.construitTable(g.version.etat)
+    return sum(int((not np.array_equal(g.version.couts[src], l[1])) or (g.version.table[src].keys() != l[0].keys())) for src, l in complete.items())
+
+def scenario(nJetons, densite, sauts, nRequetes, exhaustifMax, echantillons, rng):
+    g = grapheSynthetique(nJetons, densite, rng)
+    # la table telle qu'en production (pathfinder.SAUTSTABLE): construction complete, puis mise a jour par logs Sync
+    lignes = {"construitTable": chronometre(lambda: g.publie(g.csr.compile(), g.reservesArcs()), echantillons)}
+    adresses = list(g.arcsParPaire)
+    def sync():
+        g.majPaires({a: (int(g.arcsParPaire[a][0].reserve0 * rng.uniform(0.9, 1.1)), g.arcsParPaire[a][0].reserve1) for a in rng.sample(adresses, min(3, len(adresses)))})
+    lignes["majPaires"] = chronometre(sync, echantillons)
+    lignes["majPaires"]["ecarts"] = verifieMajPaires(g, rng)
+
+    requetes = [tuple(rng.sample(list(g.sommets), 2)) for _ in range(nRequetes)]
+    resultats = {}
+    for nom, fonction in moteurs(g, sauts).items():
+        if nom in ("tousLesChemins", "cheminPlusCourt", "cheminMoinsCher") and (nJetons > exhaustifMax):
+            continue # exponentiel
+        (lignes[nom], resultats[nom]) = mesure(fonction, requetes)
+
+    # couts compares a csr.chemin: les moteurs bornes doivent trouver les memes, l'exhaustif (chemins simples
+    # seulement) peut differer quand un cycle negatif a ete retire d'une route. La table a sa propre borne.
+    for nom in ("cheminMoinsCherBorne", "cheminMoinsCher"):
+        if nom in resultats:
+            lignes[nom]["ecarts"] = ecarts(resultats[nom], resultats["csr.chemin"])
+    etat = g.version.etat
+    lignes["table"]["ecarts"] = ecarts(resultats["table"], [g.csr.chemin(a, b, pathfinder.SAUTSTABLE, etat) for (a, b) in requetes])
+    return lignes
+
+def affiche(cle, lignes):
+    print(f"\n{cle}")
+    print(f"  {'moteur':<22}{'moyenne (us)':>14}{'p99 (us)':>12}{'pic (Ko)':>11}{'blocs':>9}{'ecarts':>8}")
+    for nom, l in lignes.items():
+        print(f"  {nom:<22}{l['moyenne']*1e6:>14.1f}{l['p99']*1e6:>12.1f}{l['pic']/1024:>11.1f}{l['blocs']:>9}{l.get('ecarts', ''):>8}")
+
+def regressions(mesures, reference, tolerance):
+    lentes = []
+    for cle, lignes in mesures.items():
+        for nom, l in lignes.items():
+            ref = reference.get(cle, {}).get(nom)
+            if ref and (l["moyenne"] > ref["moyenne"] * (1 + tolerance)):
+                lentes.append(f"{cle} {nom}: {ref['moyenne']*1e6:.1f}us -> {l['moyenne']*1e6:.1f}us")
+            if ref and (l.get("ecarts", 0) > ref.get("ecarts", 0)):
+                lentes.append(f"{cle} {nom}: {ref.get('ecarts', 0)} -> {l['ecarts']} ecarts de cout")
+    return lentes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne du pathfinder sur graphes synthetiques")
+    parser.add_argument("--tailles", default="10,50,200", help="nombres de jetons, separes par des virgules")
+    parser.add_argument("--densites", default="2,6", help="paires par jeton (moyenne), separees par des virgules")
+    parser.add_argument("--sauts", type=int, default=pathfinder.SAUTSCOTATION, help="nombre max d'arcs par route (la table garde pathfinder.SAUTSTABLE)")
+    parser.add_argument("--requetes", type=int, default=100, help="requetes (src, dest) par scenario")
+    parser.add_argument("--exhaustif-max", type=int, default=50, help="taille max pour les moteurs exhaustifs")
+    parser.add_argument("--echantillons", type=int, default=5, help="constructions de table (et mises a jour) chronometrees par scenario")
+    parser.add_argument("--graine", type=int, default=42)
+    parser.add_argument("--json", help="ecrit les mesures dans ce fichier")
+    parser.add_argument("--reference", help="mesures precedentes (--json) a comparer")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="ralentissement tolere avant echec (0.25: +25%%)")
+    args = parser.parse_args()
+
+    mesures = {}
+    for nJetons in [int(t) for t in args.tailles.split(",")]:
+        for densite in [int(d) for d in args.densites.split(",")]:
+            cle = f"{nJetons} jetons, densite {densite}"
+            mesures[cle] = scenario(nJetons, densite, args.sauts, args.requetes, args.exhaustif_max, args.echantillons, random.Random(f"{args.graine}-{cle}"))
+            affiche(cle, mesures[cle])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(mesures, f, indent=1)
+    if args.reference:
+        with open(args.reference) as f:
+            lentes = regressions(mesures, json.load(f), args.tolerance)
+        for ligne in lentes:
+            print(f"REGRESSION {ligne}")
+        sys.exit(1 if lentes else 0)
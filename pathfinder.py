@@ -1,4 +1,5 @@
-import time, rich
+import time, rich, threading
+from collections import namedtuple
 import graphtest as graph
 from web3 import Web3, HTTPProvider
 from web3.auto import w3
@@ -6,6 +7,11 @@ from web3.auto import w3
 import numpy as np
 
 LOG9975 = np.log(0.9975)
+FRAIS = np.exp(LOG9975) # part de l'entree qui reste apres les frais de 0.25%
+
+SAUTSCOTATION = 3 # nombre max d'arcs des routes candidates pour la cotation
+SAUTSTABLE = 4 # nombre max d'arcs des routes de la table (/swappath), borne chaque Bellman-Ford
+CANDIDATSMAX = 16 # nombre max de routes cotees par requete (/swapquote)
 
 
 ERC20ABI = """[{"constant":true,"inputs":[],"name":"name","outputs":[{"name":"","type":"string"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"name":"_spender","type":"address"},{"name":"_value","type":"uint256"}],"name":"approve","outputs":[{"name":"","type":"bool"}],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"totalSupply","outputs":[{"name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"name":"_from","type":"address"},{"name":"_to","type":"address"},{"name":"_value","type":"uint256"}],"name":"transferFrom","outputs":[{"name":"","type":"bool"}],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"decimals","outputs":[{"name":"","type":"uint8"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[{"name":"_owner","type":"address"}],"name":"balanceOf","outputs":[{"name":"balance","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"symbol","outputs":[{"name":"","type":"string"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"name":"_to","type":"address"},{"name":"_value","type":"uint256"}],"name":"transfer","outputs":[{"name":"","type":"bool"}],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[{"name":"_owner","type":"address"},{"name":"_spender","type":"address"}],"name":"allowance","outputs":[{"name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"payable":true,"stateMutability":"payable","type":"fallback"},{"anonymous":false,"inputs":[{"indexed":true,"name":"owner","type":"address"},{"indexed":true,"name":"spender","type":"address"},{"indexed":false,"name":"value","type":"uint256"}],"name":"Approval","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"name":"from","type":"address"},{"indexed":true,"name":"to","type":"address"},{"indexed":false,"name":"value","type":"uint256"}],"name":"Transfer","type":"event"}]"""
@@ -26,27 +32,40 @@ class ArcPaire(graph.Arc):
     reservesrc = 0
     reservedest = 0
     
-    def __init__(self, paire, sensDirect):
+    def __init__(self, paire, sensDirect, meta=None, reserves=None):
         self.paire = paire
         self.sensDirect = sensDirect
-        self.token0 = paire.functions.token0().call()
-        self.token1 = paire.functions.token1().call()
+        # meta: magasin de metadonnees (metastore.MetadataStore), evite de redemander token0/token1/symbol a chaque demarrage
+        if meta:
+            metaPaire = meta.pair(paire)
+            (self.token0, self.token1) = (metaPaire["token0"], metaPaire["token1"])
+        else:
+            self.token0 = paire.functions.token0().call()
+            self.token1 = paire.functions.token1().call()
         
         (self.srcaddr, self.destaddr) = (self.token0, self.token1) if sensDirect else (self.token1, self.token0)
         
-        (self.cntsrc, self.cntdest) = (CHAIN.eth.contract(address=self.srcaddr, abi=ERC20ABI), CHAIN.eth.contract(address=self.destaddr, abi=ERC20ABI))
-        (self.tickersrc, self.tickerdest) = (self.cntsrc.functions.symbol().call(), self.cntdest.functions.symbol().call())
+        (self.cntsrc, self.cntdest) = (paire.web3.eth.contract(address=self.srcaddr, abi=ERC20ABI), paire.web3.eth.contract(address=self.destaddr, abi=ERC20ABI))
+        self.cout = np.inf # pas de liquidite, pas de passage
+        if meta:
+            (self.tickersrc, self.tickerdest) = (meta.token(self.cntsrc)["symbol"], meta.token(self.cntdest)["symbol"])
+        else:
+            (self.tickersrc, self.tickerdest) = (self.cntsrc.functions.symbol().call(), self.cntdest.functions.symbol().call())
         
-        self.refresh()
+        self.refresh(reserves)
 
-    def refresh(self):
-        # balekouilles de la timestamp
-        self.reserve0, self.reserve1, _ = self.paire.functions.getReserves().call()
+    def refresh(self, reserves=None):
+        # reserves: (reserve0, reserve1) deja recuperees (une seule requete groupee pour toutes les paires), sinon on demande
+        if reserves is None:
+            reserves = self.paire.functions.getReserves().call() # balekouilles de la timestamp
+        self.reserve0, self.reserve1 = reserves[0], reserves[1]
         self.reservesrc, self.reservedest = (self.reserve0, self.reserve1) if self.sensDirect else (self.reserve1, self.reserve0)
         if (self.reservesrc != 0) and (self.reservedest != 0):
             # en negligeant le slippage, il faudrait fournir tout reservesrc pour obtenir tout reservedest
             self.prix = self.reservesrc/self.reservedest
             self.cout = np.log(self.prix) - LOG9975 # log(prix * frais) = log(prix) + log(frais)
+        else:
+            self.cout = np.inf # pool vide
 
     def chargeObjets(self, graphe):
         self.src = graphe[self.srcaddr]
@@ -60,40 +79,219 @@ CHAINID = None
 CHAIN = None
 ARCS = []
 
+Version = namedtuple("Version", ["etat", "reserves", "table", "couts"]) # graph.EtatCSR, {paire: (reserve0, reserve1)}, {src: {dest: route}}, {src: cout par sommet}
+
 # Pancake v2 ABIs
 FACTORY_ABI = """[{"inputs":[{"internalType":"address","name":"_feeToSetter","type":"address"}],"payable":false,"stateMutability":"nonpayable","type":"constructor"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"token0","type":"address"},{"indexed":true,"internalType":"address","name":"token1","type":"address"},{"indexed":false,"internalType":"address","name":"pair","type":"address"},{"indexed":false,"internalType":"uint256","name":"","type":"uint256"}],"name":"PairCreated","type":"event"},{"constant":true,"inputs":[],"name":"INIT_CODE_PAIR_HASH","outputs":[{"internalType":"bytes32","name":"","type":"bytes32"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[{"internalType":"uint256","name":"","type":"uint256"}],"name":"allPairs","outputs":[{"internalType":"address","name":"","type":"address"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"allPairsLength","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"tokenA","type":"address"},{"internalType":"address","name":"tokenB","type":"address"}],"name":"createPair","outputs":[{"internalType":"address","name":"pair","type":"address"}],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"feeTo","outputs":[{"internalType":"address","name":"","type":"address"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"feeToSetter","outputs":[{"internalType":"address","name":"","type":"address"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[{"internalType":"address","name":"","type":"address"},{"internalType":"address","name":"","type":"address"}],"name":"getPair","outputs":[{"internalType":"address","name":"","type":"address"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"_feeTo","type":"address"}],"name":"setFeeTo","outputs":[],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"_feeToSetter","type":"address"}],"name":"setFeeToSetter","outputs":[],"payable":false,"stateMutability":"nonpayable","type":"function"}]"""
 ROUTER_ABI = """[{"inputs":[{"internalType":"address","name":"_factory","type":"address"},{"internalType":"address","name":"_WETH","type":"address"}],"stateMutability":"nonpayable","type":"constructor"},{"inputs":[],"name":"WETH","outputs":[{"internalType":"address","name":"","type":"address"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"tokenA","type":"address"},{"internalType":"address","name":"tokenB","type":"address"},{"internalType":"uint256","name":"amountADesired","type":"uint256"},{"internalType":"uint256","name":"amountBDesired","type":"uint256"},{"internalType":"uint256","name":"amountAMin","type":"uint256"},{"internalType":"uint256","name":"amountBMin","type":"uint256"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"name":"addLiquidity","outputs":[{"internalType":"uint256","name":"amountA","type":"uint256"},{"internalType":"uint256","name":"amountB","type":"uint256"},{"internalType":"uint256","name":"liquidity","type":"uint256"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"token","type":"address"},{"internalType":"uint256","name":"amountTokenDesired","type":"uint256"},{"internalType":"uint256","name":"amountTokenMin","type":"uint256"},{"internalType":"uint256","name":"amountETHMin","type":"uint256"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"name":"addLiquidityETH","outputs":[{"internalType":"uint256","name":"amountToken","type":"uint256"},{"internalType":"uint256","name":"amountETH","type":"uint256"},{"internalType":"uint256","name":"liquidity","type":"uint256"}],"stateMutability":"payable","type":"function"},{"inputs":[],"name":"factory","outputs":[{"internalType":"address","name":"","type":"address"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountOut","type":"uint256"},{"internalType":"uint256","name":"reserveIn","type":"uint256"},{"internalType":"uint256","name":"reserveOut","type":"uint256"}],"name":"getAmountIn","outputs":[{"internalType":"uint256","name":"amountIn","type":"uint256"}],"stateMutability":"pure","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountIn","type":"uint256"},{"internalType":"uint256","name":"reserveIn","type":"uint256"},{"internalType":"uint256","name":"reserveOut","type":"uint256"}],"name":"getAmountOut","outputs":[{"internalType":"uint256","name":"amountOut","type":"uint256"}],"stateMutability":"pure","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountOut","type":"uint256"},{"internalType":"address[]","name":"path","type":"address[]"}],"name":"getAmountsIn","outputs":[{"internalType":"uint256[]","name":"amounts","type":"uint256[]"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountIn","type":"uint256"},{"internalType":"address[]","name":"path","type":"address[]"}],"name":"getAmountsOut","outputs":[{"internalType":"uint256[]","name":"amounts","type":"uint256[]"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountA","type":"uint256"},{"internalType":"uint256","name":"reserveA","type":"uint256"},{"internalType":"uint256","name":"reserveB","type":"uint256"}],"name":"quote","outputs":[{"internalType":"uint256","name":"amountB","type":"uint256"}],"stateMutability":"pure","type":"function"},{"inputs":[{"internalType":"address","name":"tokenA","type":"address"},{"internalType":"address","name":"tokenB","type":"address"},{"internalType":"uint256","name":"liquidity","type":"uint256"},{"internalType":"uint256","name":"amountAMin","type":"uint256"},{"internalType":"uint256","name":"amountBMin","type":"uint256"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"name":"removeLiquidity","outputs":[{"internalType":"uint256","name":"amountA","type":"uint256"},{"internalType":"uint256","name":"amountB","type":"uint256"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"token","type":"address"},{"internalType":"uint256","name":"liquidity","type":"uint256"},{"internalType":"uint256","name":"amountTokenMin","type":"uint256"},{"internalType":"uint256","name":"amountETHMin","type":"uint256"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"name":"removeLiquidityETH","outputs":[{"internalType":"uint256","name":"amountToken","type":"uint256"},{"internalType":"uint256","name":"amountETH","type":"uint256"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"token","type":"address"},{"internalType":"uint256","name":"liquidity","type":"uint256"},{"internalType":"uint256","name":"amountTokenMin","type":"uint256"},{"internalType":"uint256","name":"amountETHMin","type":"uint256"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"name":"removeLiquidityETHSupportingFeeOnTransferTokens","outputs":[{"internalType":"uint256","name":"amountETH","type":"uint256"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"token","type":"address"},{"internalType":"uint256","name":"liquidity","type":"uint256"},{"internalType":"uint256","name":"amountTokenMin","type":"uint256"},{"internalType":"uint256","name":"amountETHMin","type":"uint256"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"},{"internalType":"bool","name":"approveMax","type":"bool"},{"internalType":"uint8","name":"v","type":"uint8"},{"internalType":"bytes32","name":"r","type":"bytes32"},{"internalType":"bytes32","name":"s","type":"bytes32"}],"name":"removeLiquidityETHWithPermit","outputs":[{"internalType":"uint256","name":"amountToken","type":"uint256"},{"internalType":"uint256","name":"amountETH","type":"uint256"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"token","type":"address"},{"internalType":"uint256","name":"liquidity","type":"uint256"},{"internalType":"uint256","name":"amountTokenMin","type":"uint256"},{"internalType":"uint256","name":"amountETHMin","type":"uint256"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"},{"internalType":"bool","name":"approveMax","type":"bool"},{"internalType":"uint8","name":"v","type":"uint8"},{"internalType":"bytes32","name":"r","type":"bytes32"},{"internalType":"bytes32","name":"s","type":"bytes32"}],"name":"removeLiquidityETHWithPermitSupportingFeeOnTransferTokens","outputs":[{"internalType":"uint256","name":"amountETH","type":"uint256"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"tokenA","type":"address"},{"internalType":"address","name":"tokenB","type":"address"},{"internalType":"uint256","name":"liquidity","type":"uint256"},{"internalType":"uint256","name":"amountAMin","type":"uint256"},{"internalType":"uint256","name":"amountBMin","type":"uint256"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"},{"internalType":"bool","name":"approveMax","type":"bool"},{"internalType":"uint8","name":"v","type":"uint8"},{"internalType":"bytes32","name":"r","type":"bytes32"},{"internalType":"bytes32","name":"s","type":"bytes32"}],"name":"removeLiquidityWithPermit","outputs":[{"internalType":"uint256","name":"amountA","type":"uint256"},{"internalType":"uint256","name":"amountB","type":"uint256"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountOut","type":"uint256"},{"internalType":"address[]","name":"path","type":"address[]"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"name":"swapETHForExactTokens","outputs":[{"internalType":"uint256[]","name":"amounts","type":"uint256[]"}],"stateMutability":"payable","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountOutMin","type":"uint256"},{"internalType":"address[]","name":"path","type":"address[]"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"name":"swapExactETHForTokens","outputs":[{"internalType":"uint256[]","name":"amounts","type":"uint256[]"}],"stateMutability":"payable","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountOutMin","type":"uint256"},{"internalType":"address[]","name":"path","type":"address[]"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"name":"swapExactETHForTokensSupportingFeeOnTransferTokens","outputs":[],"stateMutability":"payable","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountIn","type":"uint256"},{"internalType":"uint256","name":"amountOutMin","type":"uint256"},{"internalType":"address[]","name":"path","type":"address[]"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"name":"swapExactTokensForETH","outputs":[{"internalType":"uint256[]","name":"amounts","type":"uint256[]"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountIn","type":"uint256"},{"internalType":"uint256","name":"amountOutMin","type":"uint256"},{"internalType":"address[]","name":"path","type":"address[]"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"name":"swapExactTokensForETHSupportingFeeOnTransferTokens","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountIn","type":"uint256"},{"internalType":"uint256","name":"amountOutMin","type":"uint256"},{"internalType":"address[]","name":"path","type":"address[]"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"name":"swapExactTokensForTokens","outputs":[{"internalType":"uint256[]","name":"amounts","type":"uint256[]"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountIn","type":"uint256"},{"internalType":"uint256","name":"amountOutMin","type":"uint256"},{"internalType":"address[]","name":"path","type":"address[]"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"name":"swapExactTokensForTokensSupportingFeeOnTransferTokens","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountOut","type":"uint256"},{"internalType":"uint256","name":"amountInMax","type":"uint256"},{"internalType":"address[]","name":"path","type":"address[]"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"name":"swapTokensForExactETH","outputs":[{"internalType":"uint256[]","name":"amounts","type":"uint256[]"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"uint256","name":"amountOut","type":"uint256"},{"internalType":"uint256","name":"amountInMax","type":"uint256"},{"internalType":"address[]","name":"path","type":"address[]"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"deadline","type":"uint256"}],"name":"swapTokensForExactTokens","outputs":[{"internalType":"uint256[]","name":"amounts","type":"uint256[]"}],"stateMutability":"nonpayable","type":"function"},{"stateMutability":"payable","type":"receive"}]"""
 PAIR_ABI = """[{"inputs":[],"payable":false,"stateMutability":"nonpayable","type":"constructor"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"owner","type":"address"},{"indexed":true,"internalType":"address","name":"spender","type":"address"},{"indexed":false,"internalType":"uint256","name":"value","type":"uint256"}],"name":"Approval","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"sender","type":"address"},{"indexed":false,"internalType":"uint256","name":"amount0","type":"uint256"},{"indexed":false,"internalType":"uint256","name":"amount1","type":"uint256"},{"indexed":true,"internalType":"address","name":"to","type":"address"}],"name":"Burn","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"sender","type":"address"},{"indexed":false,"internalType":"uint256","name":"amount0","type":"uint256"},{"indexed":false,"internalType":"uint256","name":"amount1","type":"uint256"}],"name":"Mint","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"sender","type":"address"},{"indexed":false,"internalType":"uint256","name":"amount0In","type":"uint256"},{"indexed":false,"internalType":"uint256","name":"amount1In","type":"uint256"},{"indexed":false,"internalType":"uint256","name":"amount0Out","type":"uint256"},{"indexed":false,"internalType":"uint256","name":"amount1Out","type":"uint256"},{"indexed":true,"internalType":"address","name":"to","type":"address"}],"name":"Swap","type":"event"},{"anonymous":false,"inputs":[{"indexed":false,"internalType":"uint112","name":"reserve0","type":"uint112"},{"indexed":false,"internalType":"uint112","name":"reserve1","type":"uint112"}],"name":"Sync","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"from","type":"address"},{"indexed":true,"internalType":"address","name":"to","type":"address"},{"indexed":false,"internalType":"uint256","name":"value","type":"uint256"}],"name":"Transfer","type":"event"},{"constant":true,"inputs":[],"name":"DOMAIN_SEPARATOR","outputs":[{"internalType":"bytes32","name":"","type":"bytes32"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"MINIMUM_LIQUIDITY","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"PERMIT_TYPEHASH","outputs":[{"internalType":"bytes32","name":"","type":"bytes32"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[{"internalType":"address","name":"","type":"address"},{"internalType":"address","name":"","type":"address"}],"name":"allowance","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"spender","type":"address"},{"internalType":"uint256","name":"value","type":"uint256"}],"name":"approve","outputs":[{"internalType":"bool","name":"","type":"bool"}],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[{"internalType":"address","name":"","type":"address"}],"name":"balanceOf","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"to","type":"address"}],"name":"burn","outputs":[{"internalType":"uint256","name":"amount0","type":"uint256"},{"internalType":"uint256","name":"amount1","type":"uint256"}],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"decimals","outputs":[{"internalType":"uint8","name":"","type":"uint8"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"factory","outputs":[{"internalType":"address","name":"","type":"address"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"getReserves","outputs":[{"internalType":"uint112","name":"_reserve0","type":"uint112"},{"internalType":"uint112","name":"_reserve1","type":"uint112"},{"internalType":"uint32","name":"_blockTimestampLast","type":"uint32"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"_token0","type":"address"},{"internalType":"address","name":"_token1","type":"address"}],"name":"initialize","outputs":[],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"kLast","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"to","type":"address"}],"name":"mint","outputs":[{"internalType":"uint256","name":"liquidity","type":"uint256"}],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"name","outputs":[{"internalType":"string","name":"","type":"string"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[{"internalType":"address","name":"","type":"address"}],"name":"nonces","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"owner","type":"address"},{"internalType":"address","name":"spender","type":"address"},{"internalType":"uint256","name":"value","type":"uint256"},{"internalType":"uint256","name":"deadline","type":"uint256"},{"internalType":"uint8","name":"v","type":"uint8"},{"internalType":"bytes32","name":"r","type":"bytes32"},{"internalType":"bytes32","name":"s","type":"bytes32"}],"name":"permit","outputs":[],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"price0CumulativeLast","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"price1CumulativeLast","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"to","type":"address"}],"name":"skim","outputs":[],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":false,"inputs":[{"internalType":"uint256","name":"amount0Out","type":"uint256"},{"internalType":"uint256","name":"amount1Out","type":"uint256"},{"internalType":"address","name":"to","type":"address"},{"internalType":"bytes","name":"data","type":"bytes"}],"name":"swap","outputs":[],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"symbol","outputs":[{"internalType":"string","name":"","type":"string"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[],"name":"sync","outputs":[],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":true,"inputs":[],"name":"token0","outputs":[{"internalType":"address","name":"","type":"address"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"token1","outputs":[{"internalType":"address","name":"","type":"address"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":true,"inputs":[],"name":"totalSupply","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"payable":false,"stateMutability":"view","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"value","type":"uint256"}],"name":"transfer","outputs":[{"internalType":"bool","name":"","type":"bool"}],"payable":false,"stateMutability":"nonpayable","type":"function"},{"constant":false,"inputs":[{"internalType":"address","name":"from","type":"address"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"value","type":"uint256"}],"name":"transferFrom","outputs":[{"internalType":"bool","name":"","type":"bool"}],"payable":false,"stateMutability":"nonpayable","type":"function"}]"""
 
-def LOAD(rpc, pairs):
-    global CHAIN, ARCS
+def reservesArc(arc, reserves=None):
+    # (reservesrc, reservedest) de l'arc dans une version, sinon celles de l'objet
+    if (reserves is None) or (arc.paire.address not in reserves):
+        return (arc.reservesrc, arc.reservedest)
+    (r0, r1) = reserves[arc.paire.address]
+    return (r0, r1) if arc.sensDirect else (r1, r0)
+
+def cotation(routes, montants, reserves=None):
+    """
+        Applique getAmountOut (produit constant, frais de 0.25%) le long de chaque route, pour chaque montant.
+        Tout est vectorise: une ligne par route, une colonne par montant d'entree.
+        Renvoie (sorties, impacts), impact = 1 - sortie / (montant * prix spot frais compris)
+    """
+    montants = np.asarray(montants, dtype=np.float64)
+    nSauts = max([len(r.lCouts) for r in routes] + [0])
+    rIn = np.ones((len(routes), nSauts))
+    rOut = np.ones((len(routes), nSauts))
+    actif = np.zeros((len(routes), nSauts), dtype=bool) # les routes plus courtes sont completees par des sauts neutres
+    for i, route in enumerate(routes):
+        for j, arc in enumerate(route.arcs):
+            (rIn[i, j], rOut[i, j]) = reservesArc(arc, reserves)
+            actif[i, j] = True
+
+    sorties = np.tile(montants, (len(routes), 1))
+    for j in range(nSauts):
+        entree = sorties * FRAIS
+        sorties = np.where(actif[:, j, None], (entree * rOut[:, j, None]) / (rIn[:, j, None] + entree), sorties)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        spot = np.prod(np.where(actif, (rOut / rIn) * FRAIS, 1), axis=1)
+        impacts = np.where(montants > 0, 1 - (sorties / (montants[None, :] * spot[:, None])), 0)
+    return sorties, impacts
+
+class Graphe(object):
+    """
+        Graphe des paires d'une factory, publie des versions immuables (etat CSR, reserves, table des routes).
+        Une mise a jour construit une nouvelle version et la remplace d'un coup: les lecteurs routent sur
+        celle qu'ils ont lue, sans verrou, pendant que refresh() travaille. Plusieurs graphes peuvent coexister.
+    """
+    def __init__(self, chain=None):
+        self.chain = chain
+        self.sommets = {}               # jeton -> graph.Sommet
+        self.csr = graph.GrapheCSR()
+        self.arcs = []
+        self.arcsParPaire = {}          # adresse de la paire -> ses deux arcs
+        self.version = Version(self.csr.etat, {}, {}, {})
+        self.verrou = threading.Lock()  # un seul ecrivain a la fois
+
+    def ajoute(self, pairs, meta=None, reserves=None):
+        # ajoute des paires (nouvelles paires de la factory) au graphe, sans tout reconstruire
+        # reserves: {adresse de la paire: (reserve0, reserve1)}, sinon chaque arc demande les siennes
+        with self.verrou:
+            nouveaux = []
+            for addr in [w3.toChecksumAddress(p) for p in pairs]: # juste au cas ou
+                if addr in self.arcsParPaire:
+                    continue
+                paire = self.chain.eth.contract(address=addr, abi=PAIR_ABI)
+                reservesPaire = reserves.get(addr) if reserves else None
+                paireDirecte = ArcPaire(paire, True, meta, reservesPaire) # a vers b
+                paireIndirecte = ArcPaire(paire, False, meta, reservesPaire) # b vers a (pas le meme coeff)
+                
+                for jeton in (paireDirecte.token0, paireDirecte.token1):
+                    if jeton not in self.sommets:
+                        self.sommets[jeton] = graph.Sommet(jeton)
+                        self.csr.ajouteSommet(self.sommets[jeton])
+                
+                for arc in (paireDirecte, paireIndirecte):
+                    arc.chargeObjets(self.sommets)
+                    if arc[0].ajouteDest(arc):
+                        self.csr.ajouteArc(arc)
+                    nouveaux.append(arc)
+                self.arcsParPaire[addr] = (paireDirecte, paireIndirecte)
+            self.arcs = self.arcs + nouveaux # remplace d'un coup, un refresh() peut etre en train de parcourir l'ancienne liste
+            self.publie(self.csr.compile(), self.reservesArcs(), self.version) # nouveaux jetons (lignes refaites), nouvelles routes
+            return nouveaux
+
+    def refresh(self, reserves=None):
+        # toutes les paires, nouveaux couts et nouvelle table
+        with self.verrou:
+            for arc in self.arcs:
+                arc.refresh(reserves.get(arc.paire.address) if reserves else None)
+            self.publie(self.csr.majCouts(), self.reservesArcs(), self.version)
+
+    def majPaires(self, reserves):
+        # reserves: {adresse de la paire: (reserve0, reserve1)} des seules paires qui ont change (logs Sync)
+        # seuls leurs arcs sont mis a jour dans le tableau de couts, renvoie ces arcs
+        with self.verrou:
+            sales = []
+            for addr, reservesPaire in reserves.items():
+                for arc in self.arcsParPaire.get(addr, ()):
+                    arc.refresh(reservesPaire)
+                    sales.append(arc)
+            etat = self.csr.majCouts(sales)
+            self.publie(etat, {**self.version.reserves, **reserves}, self.version, sales)
+            return sales
+
+    def reservesArcs(self):
+        return {addr: (a.reserve0, a.reserve1) for addr, (a, _) in self.arcsParPaire.items()}
+
+    def publie(self, etat, reserves, precedente=None, sales=None):
+        lignes = self.construitTable(etat, precedente, sales)
+        self.version = Version(etat, reserves, {src: l[0] for src, l in lignes.items()}, {src: l[1] for src, l in lignes.items()})
+
+    def construitTable(self, etat, precedente=None, sales=None):
+        """
+            Une ligne par jeton de depart (un Bellman-Ford d'au plus SAUTSTABLE arcs chacun).
+            Depuis une version precedente, seules les routes dont le cout a change sont reconstruites.
+            sales: seuls ces arcs ont change de cout (meme structure), seuls les jetons qui peuvent les emprunter
+            sont recalcules, les autres lignes sont reprises telles quelles de la version precedente.
+        """
+        touches = None
+        if (sales is not None) and precedente and (precedente.etat.indices is etat.indices):
+            touches = self.csr.sourcesTouchees(etat, sales, SAUTSTABLE)
+        lignes = {}
+        for src, i in etat.ids.items():
+            if precedente and (src in precedente.couts):
+                avant = (precedente.table.get(src, {}), precedente.couts[src])
+                if (touches is not None) and not touches[i]:
+                    lignes[src] = avant
+                    continue
+            else:
+                avant = None
+            lignes[src] = self.csr.ligneTable(src, SAUTSTABLE, etat, avant)
+        return lignes
+
+    def route(self, src, dest):
+        # route la moins chere, lue dans la table (None si dest est inaccessible)
+        return self.version.table.get(src, {}).get(dest)
+
+    def candidats(self, src, dest, maxK=SAUTSCOTATION, version=None):
+        """
+            Routes d'au plus maxK arcs, lues dans la version (son etat CSR, pas les Sommet.arcs qui changent pendant un ajout):
+            pour chaque fin de route (un ou deux derniers arcs vers dest), le debut le moins cher de chaque longueur
+            (couches du Bellman-Ford). Les CANDIDATSMAX moins cheres au prix spot, plus la route de la table si elle est plus longue.
+        """
+        version = version or self.version
+        etat = version.etat
+        (s, d) = (etat.ids.get(src), etat.ids.get(dest))
+        if (s is None) or (d is None):
+            return []
+        # les debuts de route ne repassent ni par src ni par dest (la marche la moins chere le ferait, et serait coupee)
+        dist, parents = self.csr.bellmanFord(etat.avecCouts(np.where((etat.indices == s) | (etat.srcs == d), np.inf, etat.couts)), s, maxK-1)
+        dernier = np.flatnonzero((etat.indices == d) & (etat.srcs != d)) # arcs vers dest
+        arcVers = np.full(len(etat.sommets), -1, dtype=np.int64) # sommet -> son arc vers dest
+        arcVers[etat.srcs[dernier]] = dernier
+        avantDernier = np.flatnonzero((arcVers[etat.indices] >= 0) & (etat.indices != s) & (etat.srcs != d) & (etat.srcs != etat.indices))
+        fins = [[e] for e in dernier] + [[e, arcVers[etat.indices[e]]] for e in avantDernier]
+        departs = np.concatenate((etat.srcs[dernier], etat.srcs[avantDernier]))
+        longueurs = np.concatenate((np.ones(len(dernier)), np.full(len(avantDernier), 2)))
+        couts = dist[:, departs] + np.concatenate((etat.couts[dernier], etat.couts[avantDernier] + etat.couts[arcVers[etat.indices[avantDernier]]]))
+        couts[(np.arange(len(dist))[:, None] + longueurs[None, :]) > maxK] = np.inf # [arcs du debut, fin de route]
+        routes = []
+        for i in np.argsort(couts, axis=None):
+            (k, j) = np.unravel_index(i, couts.shape)
+            if (len(routes) >= CANDIDATSMAX) or not np.isfinite(couts[k, j]):
+                break
+            emplacements = self.csr.marche(etat, parents, k, departs[j]) + fins[j]
+            arcs = graph.retireCycles(etat.sommets[s], [etat.arcs[etat.ordre[e]] for e in emplacements])
+            route = self.csr.route(etat, s, arcs) if len(arcs) else None
+            if route and not any(r.noeuds == route.noeuds for r in routes):
+                routes.append(route)
+        spot = version.table.get(src, {}).get(dest)
+        if spot and not any(r.noeuds == spot.noeuds for r in routes):
+            routes.append(spot)
+        return routes
+
+    def meilleuresCotations(self, src, dest, montants, maxK=SAUTSCOTATION):
+        # routes candidates triees par sortie decroissante, pour chaque montant
+        version = self.version
+        routes = self.candidats(src, dest, maxK, version)
+        if not len(routes):
+            return [[] for _ in montants]
+        sorties, impacts = cotation(routes, montants, version.reserves)
+        ordre = np.argsort(-sorties, axis=0)
+        return [[(routes[i], sorties[i, m], impacts[i, m]) for i in ordre[:, m]] for m in range(len(montants))]
+
+# graphe par defaut du module (LOAD, refresh...)
+DEFAUT = Graphe()
+
+def LOAD(rpc, pairs, meta=None, reserves=None):
+    global CHAIN, ARCS, DEFAUT
     # assumes it's already a web3 object (allows the use of a shared object)
     CHAIN = Web3(HTTPProvider(rpc)) if type(rpc) == str else rpc
-    # juste au cas ou
-    PAIRS = [w3.toChecksumAddress(p) for p in pairs]
-
-    # charge le backend
-    TOKENS = []
-    ARCS = []
-    for addr in PAIRS:
-        paire = CHAIN.eth.contract(address=addr, abi=PAIR_ABI)
-        paireDirecte = ArcPaire(paire, True)
-        paireIndirecte = ArcPaire(paire, False)
-        ARCS.append(paireDirecte) # a vers b
-        ARCS.append(paireIndirecte) # b vers a (pas le meme coeff)
-        
-        graph.creeSommet(paireDirecte.token0)
-        graph.creeSommet(paireDirecte.token1)
-        
-        paireDirecte.chargeObjets(graph.graph)
-        paireIndirecte.chargeObjets(graph.graph)
-        
-        graph.ajouteArc(paireDirecte)
-        graph.ajouteArc(paireIndirecte)
+    DEFAUT = Graphe(CHAIN)
+    ARCS = DEFAUT.ajoute(pairs, meta, reserves)
+
+def AJOUTE(pairs, meta=None, reserves=None):
+    global ARCS
+    nouveaux = DEFAUT.ajoute(pairs, meta, reserves)
+    ARCS = DEFAUT.arcs
+    return nouveaux
+
+def refresh(reserves=None):
+    DEFAUT.refresh(reserves)
+
+def majPaires(reserves):
+    return DEFAUT.majPaires(reserves)
+
+def route(src, dest):
+    return DEFAUT.route(src, dest)
+
+def candidats(src, dest, maxK=SAUTSCOTATION):
+    return DEFAUT.candidats(src, dest, maxK)
 
-def refresh():
-    for arc in ARCS:
-        arc.refresh()
+def meilleuresCotations(src, dest, montants, maxK=SAUTSCOTATION):
+    return DEFAUT.meilleuresCotations(src, dest, montants, maxK)
 
 def prettyPrint(chemin, ticker1, ticker2):
     rich.print(f"[yellow]Nouveau chemin trouve:[/yellow] [green]{chemin}[/green] 1 {ticker1} coute {np.exp(chemin.cout)} {ticker2}")
\ No newline at end of file
@@ -0,0 +1,300 @@
+"""
+    Local stand-in for a RaptorChain node, used to benchmark the explorer offline.
+
+    Serves the REST routes the explorer uses (/chain/block, /chain/blockByHash, /get/transactions,
+    /get/nLastTxs, /accounts/accountInfo, /stats) and the /web3 JSON-RPC methods it relies on
+    (eth_call, eth_getTransactionReceipt, eth_getLogs...) from a fixtures file, with optional
+    injected latency. Every call is counted so a benchmark can report upstream calls per page.
+
+    python stubnode.py --record fixtures.json     # generates a synthetic chain and saves it
+    python stubnode.py --fixtures fixtures.json --latency 20
+"""
+import argparse, json, random, threading, time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import eth_abi
+from web3.auto import w3
+
+ZERO = "0x0000000000000000000000000000000000000000"
+BURN = "0x000000000000000000000000000000000000dead"
+WRPTR = "0xeF7cADE66695f4cD8a535f7916fBF659936818C4"
+DUCO = "0x9ffE5c6EB6A8BFFF1a9a9DC07406629616c19d32"
+FACTORY = "0xB8F7aAdaC20Cd74237dDAB7AC7ead317BF049Fa3"
+RPTR_BSC = "0x44C99Ca267C2b2646cEEc72e898273085aB87ca5" # RPTR on BSC (/totalSupply), served on the same /web3 endpoint
+
+def selector(signature):
+    return "0x" + w3.keccak(text=signature)[:4].hex().replace("0x", "")
+
+SELECTORS = {selector(sig): name for (sig, name) in [
+    ("name()", "name"), ("symbol()", "symbol"), ("decimals()", "decimals"), ("totalSupply()", "totalSupply"),
+    ("balanceOf(address)", "balanceOf"), ("allPairsLength()", "allPairsLength"), ("allPairs(uint256)", "allPairs"),
+    ("token0()", "token0"), ("token1()", "token1"), ("getReserves()", "getReserves"),
+]}
+SYNC_TOPIC = w3.keccak(text="Sync(uint112,uint112)").hex()
+TRANSFER_TOPIC = w3.keccak(text="Transfer(address,address,uint256)").hex()
+
+
+def randomAddress(rng):
+    return w3.toChecksumAddress("0x" + ("%040x" % rng.getrandbits(160)))
+
+def topicAddress(addr):
+    return "0x" + ("0" * 24) + addr.lower().replace("0x", "")
+
+
+def buildFixtures(seed=42, blocks=200, accounts=50, tokens=6, txsPerBlock=4):
+    """
+        Generates a deterministic synthetic chain: blocks, legacy and web3 transactions, accounts,
+        ERC20 tokens, RaptorSwap pairs with reserves and Sync logs.
+    """
+    rng = random.Random(seed)
+    addrs = [randomAddress(rng) for _ in range(accounts)]
+    tokenAddrs = [WRPTR, DUCO] + [randomAddress(rng) for _ in range(max(tokens-2, 0))]
+
+    contracts = {}
+    for n, t in enumerate(tokenAddrs):
+        _sym = ["WRPTR", "DUCO"][n] if n < 2 else f"TKN{n}"
+        contracts[t.lower()] = {"name": f"{_sym} token", "symbol": _sym, "decimals": 18, "totalSupply": 10**27, "balances": {a.lower(): rng.randrange(0, 10**22) for a in rng.sample(addrs, accounts//3)}}
+
+    contracts[RPTR_BSC.lower()] = {"name": "Raptor Finance", "symbol": "RPTR", "decimals": 18, "totalSupply": 10**26, "balances": {}}
+
+    pairs = []
+    for n in range(1, len(tokenAddrs)):
+        for m in ([0] + ([n-1] if n > 1 else [])):
+            (t0, t1) = sorted([tokenAddrs[m], tokenAddrs[n]], key=lambda a: a.lower())
+            _pair = randomAddress(rng)
+            contracts[_pair.lower()] = {"name": "RaptorSwap LPs", "symbol": "RAPTOR-LP", "decimals": 18, "totalSupply": 10**24, "balances": {}, "token0": t0, "token1": t1, "reserves": [rng.randrange(10**20, 10**24), rng.randrange(10**20, 10**24)]}
+            pairs.append(_pair)
+
+    chain = {}
+    hashes = {}
+    txs = {}
+    txOrder = []
+    receipts = {}
+    accountTxs = {a.lower(): [] for a in addrs + [BURN]}
+    logs = []
+    parent = "0x" + "00"*32
+    t0 = int(time.time()) - (blocks * 10)
+    for h in range(blocks):
+        _miner = rng.choice(addrs)
+        _proof = "0x" + ("%064x" % rng.getrandbits(256))
+        _txids = []
+        _epoch = _proof
+        for n in range((txsPerBlock if h else 0) + (1 if h else 0)):
+            if n == 0:
+                _data = json.dumps({"type": 1, "from": _miner, "blockData": {"miningData": {"miner": _miner, "proof": _proof}, "height": h}, "epoch": _epoch, "parent": parent})
+                _affected = [_miner]
+            else:
+                (_from, _to) = rng.sample(addrs, 2)
+                if n % 5 == 4:
+                    _to = BURN
+                _data = json.dumps({"type": 0, "from": _from, "to": _to, "tokens": rng.randrange(0, 10**21), "callData": "", "epoch": _epoch, "parent": parent, "nonce": h*100 + n})
+                _affected = [_from, _to]
+            _txid = w3.soliditySha3(["string"], [_data]).hex()
+            txs[_txid] = {"data": _data, "hash": _txid}
+            _txids.append(_txid)
+            txOrder.append(_txid)
+            for a in _affected:
+                accountTxs.setdefault(a.lower(), []).append(_txid)
+            _logs = []
+            if (n > 0) and (n % 2 == 0):
+                _token = rng.choice(tokenAddrs)
+                _logs.append({"address": _token, "topics": [TRANSFER_TOPIC, topicAddress(_affected[0]), topicAddress(_affected[1])], "data": "0x%064x" % rng.randrange(1, 10**20), "blockNumber": hex(h), "transactionHash": _txid, "logIndex": "0x0", "transactionIndex": hex(n), "blockHash": _proof, "removed": False})
+            receipts[_txid] = {"transactionHash": _txid, "blockHash": _proof, "blockNumber": hex(h), "transactionIndex": hex(n), "from": _affected[0], "to": _affected[-1], "gasUsed": hex(21000 if n else 0), "cumulativeGasUsed": hex(21000*n), "status": "0x1", "contractAddress": None, "logs": _logs}
+        if h and (h % 7 == 0):
+            _pair = rng.choice(pairs)
+            _reserves = contracts[_pair.lower()]["reserves"]
+            _reserves[0] = max(1, _reserves[0] + rng.randrange(-10**19, 10**19))
+            _reserves[1] = max(1, _reserves[1] + rng.randrange(-10**19, 10**19))
+            logs.append({"address": _pair, "topics": [SYNC_TOPIC], "data": "0x" + eth_abi.encode_abi(["uint112", "uint112"], _reserves).hex(), "blockNumber": hex(h), "transactionHash": _txids[0], "logIndex": "0x0", "transactionIndex": "0x0", "blockHash": _proof, "removed": False})
+        chain[str(h)] = {"height": h, "parent": parent, "timestamp": t0 + (h*10), "miningData": {"miner": _miner, "proof": _proof}, "txsRoot": "0x" + "00"*32, "transactions": _txids, "decodedMessages": []}
+        hashes[_proof] = h
+        parent = _proof
+
+    accts = {}
+    for a, _txs in accountTxs.items():
+        accts[a] = {"balance": rng.randrange(0, 10**22) if a != BURN else 10**21, "nonce": len(_txs), "transactions": ([ZERO] + _txs), "code": "", "storage": {}}
+
+    return {
+        "blocks": chain, "blockHashes": hashes, "transactions": txs, "txOrder": txOrder, "receipts": receipts,
+        "accounts": accts, "contracts": contracts, "factory": {"address": FACTORY, "pairs": pairs}, "logs": logs,
+        "stats": {"coin": {"supply": 10**26, "holders": len(accts), "transactions": len(txOrder)}, "chain": {"length": blocks, "lastBlockHash": parent}},
+        "price": 0.0042,
+    }
+
+
+class StubNode(object):
+    def __init__(self, fixtures, latency=0.0):
+        self.fx = fixtures
+        self.latency = latency  # seconds added to every call
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.server = None
+
+    def count(self, name):
+        with self.lock:
+            self.calls[name] += 1
+
+    def resetCalls(self):
+        with self.lock:
+            _calls = dict(self.calls)
+            self.calls.clear()
+        return _calls
+
+    # REST routes
+    def get(self, path):
+        parts = [p for p in path.split("?")[0].split("/") if p]
+        if parts[:2] == ["chain", "block"]:
+            self.count("/chain/block")
+            return self.fx["blocks"].get(parts[2])
+        if parts[:2] == ["chain", "blockByHash"]:
+            self.count("/chain/blockByHash")
+            _h = self.fx["blockHashes"].get(parts[2])
+            return self.fx["blocks"].get(str(_h)) if (_h is not None) else None
+        if parts[:2] == ["get", "transactions"]:
+            self.count("/get/transactions")
+            return [self.fx["transactions"][t] for t in (parts[2].split(",") if len(parts) > 2 else []) if t in self.fx["transactions"]]
+        if parts[:2] == ["get", "nLastTxs"]:
+            self.count("/get/nLastTxs")
+            return [self.fx["transactions"][t] for t in self.fx["txOrder"][-int(parts[2]):]]
+        if parts[:2] == ["accounts", "accountInfo"]:
+            self.count("/accounts/accountInfo")
+            return self.fx["accounts"].get(parts[2].lower(), {"balance": 0, "nonce": 0, "transactions": [ZERO], "code": ""})
+        if parts[:1] == ["stats"]:
+            self.count("/stats")
+            return self.fx["stats"]
+        if parts[:4] == ["api", "1", "market", "data"]:
+            self.count("mobula")
+            return {"price": self.fx["price"]}
+        raise KeyError(path)
+
+    # JSON-RPC methods
+    def ethCall(self, tx):
+        _to = tx["to"].lower()
+        _data = tx.get("data") or tx.get("input")
+        _method = SELECTORS.get(_data[:10])
+        _args = bytes.fromhex(_data[10:])
+        if _to == FACTORY.lower():
+            if _method == "allPairsLength":
+                return eth_abi.encode_abi(["uint256"], [len(self.fx["factory"]["pairs"])])
+            if _method == "allPairs":
+                return eth_abi.encode_abi(["address"], [self.fx["factory"]["pairs"][eth_abi.decode_single("uint256", _args)]])
+        _c = self.fx["contracts"].get(_to)
+        if (not _c) or (not _method):
+            return b""
+        if _method in ("name", "symbol"):
+            return eth_abi.encode_abi(["string"], [_c[_method]])
+        if _method in ("decimals", "totalSupply"):
+            return eth_abi.encode_abi(["uint256"], [_c[_method]])
+        if _method == "balanceOf":
+            return eth_abi.encode_abi(["uint256"], [_c["balances"].get(eth_abi.decode_single("address", _args).lower(), 0)])
+        if _method in ("token0", "token1"):
+            return eth_abi.encode_abi(["address"], [_c[_method]])
+        if _method == "getReserves":
+            return eth_abi.encode_abi(["uint112", "uint112", "uint32"], _c["reserves"] + [int(time.time()) % 2**32])
+        return b""
+
+    def getLogs(self, _filter):
+        _from = int(_filter.get("fromBlock", "0x0"), 16)
+        _to = int(_filter.get("toBlock", hex(self.fx["stats"]["chain"]["length"] - 1)), 16)
+        _addrs = _filter.get("address")
+        _addrs = set(a.lower() for a in ([_addrs] if isinstance(_addrs, str) else (_addrs or [])))
+        _topics = _filter.get("topics") or []
+        _topic0 = (_topics[0] if len(_topics) else None)
+        _topic0 = set([_topic0] if isinstance(_topic0, str) else (_topic0 or []))
+        return [l for l in self.fx["logs"] if (_from <= int(l["blockNumber"], 16) <= _to) and ((not _addrs) or (l["address"].lower() in _addrs)) and ((not _topic0) or (l["topics"][0] in _topic0))]
+
+    def rpc(self, req):
+        _method = req.get("method")
+        _params = req.get("params", [])
+        self.count(f"rpc:{_method}")
+        if _method == "eth_call":
+            _result = "0x" + self.ethCall(_params[0]).hex()
+        elif _method == "eth_chainId":
+            _result = hex(499597202514)
+        elif _method == "net_version":
+            _result = "499597202514"
+        elif _method == "eth_blockNumber":
+            _result = hex(self.fx["stats"]["chain"]["length"] - 1)
+        elif _method == "eth_getTransactionReceipt":
+            _result = self.fx["receipts"].get(_params[0])
+        elif _method == "eth_getTransactionByHash":
+            _result = None
+        elif _method == "eth_getLogs":
+            _result = self.getLogs(_params[0])
+        else:
+            return {"jsonrpc": "2.0", "id": req.get("id"), "error": {"code": -32601, "message": f"method {_method} not supported by stub"}}
+        return {"jsonrpc": "2.0", "id": req.get("id"), "result": _result}
+
+    def handler(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive, like the real node behind nginx
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, payload, status=200):
+                _body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(_body)))
+                self.end_headers()
+                self.wfile.write(_body)
+
+            def do_GET(self):
+                if node.latency:
+                    time.sleep(node.latency)
+                if self.path.startswith("/_stub/calls"):
+                    return self.reply(node.resetCalls())
+                try:
+                    _result = node.get(self.path)
+                except KeyError:
+                    return self.reply({"success": False, "message": "not found"}, 404)
+                if self.path.startswith("/api/"):
+                    return self.reply({"data": _result})
+                self.reply({"success": True, "result": _result})
+
+            def do_POST(self):
+                if node.latency:
+                    time.sleep(node.latency)
+                _req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+                if isinstance(_req, list):
+                    node.count("rpc:batch")
+                    return self.reply([node.rpc(r) for r in _req])
+                self.reply(node.rpc(_req))
+
+        return Handler
+
+    def start(self, host="127.0.0.1", port=4242):
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub RaptorChain node serving recorded fixtures")
+    parser.add_argument("--fixtures", help="fixtures file (JSON) to serve")
+    parser.add_argument("--record", help="generate synthetic fixtures and save them to this file")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--blocks", type=int, default=200)
+    parser.add_argument("--port", type=int, default=4242)
+    parser.add_argument("--latency", type=float, default=0.0, help="injected latency per call, in ms")
+    args = parser.parse_args()
+
+    if args.record:
+        with open(args.record, "w") as f:
+            json.dump(buildFixtures(args.seed, args.blocks), f)
+    else:
+        _fx = json.load(open(args.fixtures)) if args.fixtures else buildFixtures(args.seed, args.blocks)
+        node = StubNode(_fx, args.latency / 1000).start(port=args.port)
+        print(f"stub node listening on 127.0.0.1:{args.port}")
+        while True:
+            time.sleep(3600)
@@ -0,0 +1,108 @@
+import contextvars, html, os, sys, threading, time
+from collections import deque
+
+# opt-in per-request tracing of upstream calls (EXPLORER_TRACE=1)
+# every call made while serving a request is recorded with its duration and the explorer functions that made it,
+# summarized in a response header and kept in a ring buffer shown on /debug/traces
+TRACING_ENABLED = (os.environ.get("EXPLORER_TRACE", "0") == "1")
+CALL_BUDGET = int(os.environ.get("EXPLORER_CALL_BUDGET", 20)) # pages making more upstream calls than this are flagged
+RING_SIZE = 200 # requests kept for the debug page
+CALLER_DEPTH = 6 # explorer functions recorded per call (innermost first)
+
+CURRENT = contextvars.ContextVar("explorerTrace", default=None)
+SUBMITTED_BY = contextvars.ContextVar("explorerTraceSubmittedBy", default=()) # callers of the thread that submitted a pool task
+
+class RequestTrace(object):
+    def __init__(self, method, path, rule):
+        self.method = method
+        self.path = path
+        self.rule = rule
+        self.start = time.time()
+        self.duration = 0
+        self.status = None
+        self.calls = [] # (upstream, call, duration, callers), appended from pool threads too
+
+    def record(self, upstream, call, duration, callers):
+        self.calls.append((upstream, call, duration, callers))
+
+    def overBudget(self):
+        return len(self.calls) > CALL_BUDGET
+
+    def countsByCall(self):
+        _counts = {}
+        for (upstream, call, duration, _) in list(self.calls):
+            (_n, _t) = _counts.get((upstream, call), (0, 0))
+            _counts[(upstream, call)] = (_n + 1, _t + duration)
+        return _counts
+
+    def summary(self):
+        _calls = list(self.calls)
+        _byCall = "; ".join(f"{upstream} {call}={n}" for ((upstream, call), (n, _)) in sorted(self.countsByCall().items(), key=lambda i: -i[1][0]))
+        return f"{len(_calls)} calls, {sum(c[2] for c in _calls)*1000:.1f} ms" + (f"; {_byCall}" if _byCall else "")
+
+RECENT = deque(maxlen=RING_SIZE)
+RECENT_LOCK = threading.Lock()
+
+def start(method, path, rule):
+    if not TRACING_ENABLED:
+        return None
+    if CURRENT.get() is not None:
+        return CURRENT.get() # already started by the ASGI mode, before data was prefetched
+    _trace = RequestTrace(method, path, rule)
+    CURRENT.set(_trace)
+    return _trace
+
+def finish(status):
+    _trace = CURRENT.get()
+    if _trace is None:
+        return None
+    CURRENT.set(None)
+    _trace.duration = time.time() - _trace.start
+    _trace.status = status
+    with RECENT_LOCK:
+        RECENT.append(_trace)
+    if _trace.overBudget():
+        print(f"upstream call budget exceeded on {_trace.path}: {_trace.summary()}")
+    return _trace
+
+def callers():
+    # explorer functions on the stack, innermost first (e.g. loadToken < TransferDiv < TransfersCard)
+    return " < ".join(stack()[:CALLER_DEPTH])
+
+def stack():
+    _names = []
+    _frame = sys._getframe(2)
+    while _frame and (len(_names) < CALLER_DEPTH):
+        if _frame.f_code.co_filename.endswith(("explorer.py", "asgi.py")):
+            _names.append(_frame.f_code.co_name)
+        _frame = _frame.f_back
+    return _names + list(SUBMITTED_BY.get())
+
+def record(upstream, call, duration):
+    _trace = CURRENT.get()
+    if _trace is not None:
+        _trace.record(upstream, call, duration, callers())
+
+def submitInContext(pool, function, *args):
+    # like pool.submit, but the task sees the caller's trace (in its own copy of the context)
+    _submittedBy = tuple(stack())
+    def task():
+        SUBMITTED_BY.set(_submittedBy)
+        return function(*args)
+    return pool.submit(contextvars.copy_context().run, task)
+
+def mapInContext(pool, function, items):
+    # like pool.map, with submitInContext
+    return [f.result() for f in [submitInContext(pool, function, item) for item in items]]
+
+def renderPage():
+    with RECENT_LOCK:
+        _traces = list(RECENT)[::-1]
+    _rows = []
+    for _trace in _traces:
+        _style = " style=\"background: #fdd\"" if _trace.overBudget() else ""
+        _details = "".join(f"<tr><td>{html.escape(u)}</td><td>{html.escape(str(c))}</td><td>{d*1000:.1f}</td><td>{html.escape(by)}</td></tr>" for (u, c, d, by) in list(_trace.calls))
+        _rows.append(f"""<details{_style}><summary>{time.strftime('%H:%M:%S', time.localtime(_trace.start))} {_trace.method} {html.escape(_trace.path)} - {_trace.status} - {_trace.duration*1000:.1f} ms - {html.escape(_trace.summary())}</summary>
+            <table><tr><th>upstream</th><th>call</th><th>ms</th><th>called by</th></tr>{_details}</table></details>""")
+    return f"""<html><head><title>Upstream traces</title></head><body style="font-family: monospace">
+        <h3>Last {len(_traces)} requests (call budget: {CALL_BUDGET}, over budget in red)</h3>{"".join(_rows)}</body></html>"""